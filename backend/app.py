@@ -6,6 +6,7 @@ from flask_socketio import SocketIO
 from dotenv import load_dotenv
 
 from events import main as main_blueprint
+from features.compute_pool import get_compute_pool
 load_dotenv()
 
 app = Flask(__name__, static_folder="./build", template_folder="./build")
@@ -27,4 +28,8 @@ app.register_blueprint(main_blueprint)
 
 
 if __name__ == "__main__":
+    # 오디오 처리용 작업 프로세스를 미리 띄워 Numba 커널 준비 (리로더 감시 프로세스에서는 생략)
+    # spawn으로 뜬 작업 프로세스도 이 파일을 다시 읽으므로 반드시 이 블록 안에서만 호출
+    if not app.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        get_compute_pool()
     Flask.run(app, host="0.0.0.0", port=5000)
@@ -0,0 +1,144 @@
+# region Imports
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from tempfile import TemporaryDirectory
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "features"))
+sys.path.insert(0, BENCH_DIR)
+
+from crawlService import CrawlService  # noqa: E402
+from fake_cafe_server import FakeCafeServer, load_recorded, synthetic_articles  # noqa: E402
+
+# endregion
+
+MEMBER_KEY = "bench-member"
+
+# 크롤링 방식 (이름 -> crawl_until_known 인자)
+MODES = {
+    "serial": {"per_page": 10, "concurrency": 1},
+    "concurrent": {"per_page": 50, "concurrency": 4},
+}
+
+
+# region 준비
+
+# 가짜 서버를 바라보도록 환경 변수 설정 (crawl.env보다 우선)
+def _configure_env(url):
+    os.environ.update({
+        "NAVER_CAFE_ARTICLE_API": url,
+        "NAVER_CAFE_CLUBID": "0",
+        "NAVER_CAFE_MENUID": "0",
+        "NAVER_CAFE_REACTION_MEMBERKEY": MEMBER_KEY,
+    })
+
+
+# new_count개를 제외한 나머지 반응정리 게시물이 이미 저장된 DB 생성 -> 새로 받아야 할 게시물 id 집합
+def _seed_db(db_path, articles, new_count):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    mine = [a for a in articles if a["memberKey"] == MEMBER_KEY]
+    service = CrawlService(db_path)
+    service.save_db(mine[new_count:])
+    service.db_conn.close()
+    return {int(a["articleId"]) for a in mine[:new_count]}
+
+
+def _saved_ids(db_path):
+    db_conn = sqlite3.connect(db_path)
+    ids = {int(row[0]) for row in db_conn.execute("SELECT article_id FROM posted_link")}
+    db_conn.close()
+    return ids
+
+
+# endregion
+
+# region 측정
+
+def run_mode(articles, db_path, new_count, latency, **options):
+    expected = _seed_db(db_path, articles, new_count)
+    before = _saved_ids(db_path)
+
+    with FakeCafeServer(articles, latency=latency) as server:
+        _configure_env(server.url)
+        start = time.perf_counter()
+        asyncio.run(CrawlService(db_path).crawl_until_known(**options))
+        wall = time.perf_counter() - start
+
+    missing = expected - (_saved_ids(db_path) - before)
+    return {"wall_s": round(wall, 3), "requests": server.requests, "connections": server.connections,
+            "missing": len(missing)}
+
+
+# 첫 크롤링을 fail_after번째 요청 이후 실패시키고, 다시 실행했을 때 이어서 모두 받는지 확인
+def run_resume(articles, db_path, new_count, latency, fail_after, **options):
+    expected = _seed_db(db_path, articles, new_count)
+    before = _saved_ids(db_path)
+
+    with FakeCafeServer(articles, latency=latency, fail_after=fail_after) as server:
+        _configure_env(server.url)
+        try:
+            asyncio.run(CrawlService(db_path).crawl_until_known(**options))
+            interrupted = False
+        except Exception:
+            interrupted = True
+        cursor = CrawlService(db_path).load_cursor()
+
+    with FakeCafeServer(articles, latency=latency) as server:
+        _configure_env(server.url)
+        asyncio.run(CrawlService(db_path).crawl_until_known(**options))
+
+    missing = expected - (_saved_ids(db_path) - before)
+    return {"interrupted": interrupted, "cursor": cursor, "resume_requests": server.requests,
+            "missing": len(missing)}
+
+
+# endregion
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CrawlService.crawl_until_known 오프라인 측정 (가짜 카페 서버 사용)")
+    parser.add_argument("--recorded", help="기록해 둔 목록 응답 JSON (없으면 합성 데이터)")
+    parser.add_argument("--articles", type=int, default=5000, help="합성 게시물 수")
+    parser.add_argument("--new", type=int, default=300, help="새로 받아야 할 반응정리 게시물 수")
+    parser.add_argument("--latency", type=float, default=0.1, help="요청당 서버 지연 (초)")
+    parser.add_argument("--per-page", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--output", default="bench_crawl.json")
+    args = parser.parse_args()
+
+    MODES["concurrent"] = {"per_page": args.per_page, "concurrency": args.concurrency}
+    if args.recorded:
+        articles = load_recorded(args.recorded)
+        MEMBER_KEY = os.getenv("NAVER_CAFE_REACTION_MEMBERKEY", MEMBER_KEY)
+    else:
+        articles = synthetic_articles(args.articles, MEMBER_KEY)
+
+    report = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "articles": len(articles), "new": args.new,
+              "latency": args.latency, "results": {}}
+
+    print(f"{'mode':<12} {'wall(s)':>9} {'requests':>9} {'conns':>6} {'missing':>8}")
+    with TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, "posted_link.db")
+        for name, options in MODES.items():
+            result = run_mode(articles, db_path, args.new, args.latency, **options)
+            report["results"][name] = {**options, **result}
+            print(f"{name:<12} {result['wall_s']:>9.3f} {result['requests']:>9} {result['connections']:>6} "
+                  f"{result['missing']:>8}")
+
+        resume = run_resume(articles, db_path, args.new, args.latency, fail_after=args.concurrency + 1,
+                            **MODES["concurrent"])
+        report["results"]["resume"] = resume
+        print(f"resume: 중단={resume['interrupted']} 위치={resume['cursor']} "
+              f"재실행 요청={resume['resume_requests']} 누락={resume['missing']}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n결과 저장: {args.output}")
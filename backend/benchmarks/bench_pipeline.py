@@ -0,0 +1,221 @@
+# region Imports
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from tempfile import TemporaryDirectory
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "features"))
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic import write_pair  # noqa: E402
+
+# endregion
+
+# 측정 단계 (이름 -> 설명)
+STAGES = {
+    "gcc_phat": "calculate_gcc_phat (전체 길이)",
+    "gcc_phat_multires": "calculate_gcc_phat_multires",
+    "refine_lag": "refine_lag_robust (search_range=200)",
+    "wiener_soft": "wiener_filter_soft (전체 길이, 1채널)",
+    "wiener_stream": "wiener_filter_stream (블록, 1채널)",
+    "expander": "apply_soft_expander (1채널)",
+    "align_audio": "align_audio (기본 설정)",
+    "align_audio_stream": "align_audio (block_size + multires)",
+}
+
+
+# region 메모리 측정
+
+# 현재 RSS (MB, Linux /proc 기준 - 없으면 None)
+def _current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return None
+
+
+# 프로세스 최대 RSS (MB)
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+# endregion
+
+# region 단계 실행 (단계마다 새 프로세스에서 실행하여 최대 RSS를 분리)
+
+def _alignment_error(lag, truth):
+    return int(min(abs(lag - t) for t in truth["lags"]))
+
+
+# 정렬 보고서의 지연값 (정수 또는 지연 맵) 중 가장 큰 오차
+def _report_error(lag, truth):
+    lags = lag["seg_lags"] if isinstance(lag, dict) else [lag]
+    return max(_alignment_error(v, truth) for v in lags)
+
+
+def _run_stage(stage, ref_path, mic_path, truth, out_dir):
+    import numpy as np
+    from audio_utils import WavReader, calculate_gcc_phat, calculate_gcc_phat_multires, refine_lag_robust, \
+        array_block_reader, aligned_block_reader, align_ref_to_mic_canvas
+    from align_audio import wiener_filter_soft, wiener_filter_stream, apply_soft_expander, align_audio
+    from profiling import StageProfiler
+
+    fs = truth["fs"]
+    lag = truth["lags"][0]
+    ref_src = WavReader(ref_path)
+    mic_src = WavReader(mic_path)
+
+    # 입력 준비는 측정에서 제외
+    if stage in ("gcc_phat", "gcc_phat_multires", "refine_lag"):
+        ref, mic = np.asarray(ref_src.mono()), np.asarray(mic_src.mono())
+    elif stage in ("wiener_soft", "expander"):
+        ref, mic = ref_src.channel(0), np.asarray(mic_src.channel(0))
+        if stage == "wiener_soft":
+            ref = align_ref_to_mic_canvas(ref, len(mic), lag)
+    elif stage == "wiener_stream":
+        ref, mic = ref_src.channel(0), mic_src.channel(0)
+
+    # Numba 컴파일 / 캐시 로드 제외
+    if stage == "expander":
+        apply_soft_expander(mic[:fs], fs=fs)
+    elif stage == "refine_lag":
+        refine_lag_robust(ref[:fs * 2], mic[:fs * 2], 0, search_range=5)
+
+    rss_before = _current_rss_mb()
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    error = None
+    stages = None
+
+    if stage == "gcc_phat":
+        error = _alignment_error(calculate_gcc_phat(mic, ref), truth)
+    elif stage == "gcc_phat_multires":
+        error = _alignment_error(calculate_gcc_phat_multires(mic, ref, fs), truth)
+    elif stage == "refine_lag":
+        error = _alignment_error(refine_lag_robust(ref, mic, initial_lag=lag + 7, search_range=200), truth)
+    elif stage == "wiener_soft":
+        wiener_filter_soft(ref, mic, 0.5, 0.2)
+    elif stage == "wiener_stream":
+        for _ in wiener_filter_stream(aligned_block_reader(ref, len(mic), lag), array_block_reader(mic), len(mic),
+                                      0.5, 0.2):
+            pass
+    elif stage == "expander":
+        apply_soft_expander(mic, fs=fs)
+    elif stage in ("align_audio", "align_audio_stream"):
+        # 단계별 시간과 최종 지연값만 기록 (메모리 추적은 측정 시간을 늘리므로 끔)
+        options = {"block_size": 1 << 17, "multires": True} if stage == "align_audio_stream" else {}
+        _, report = align_audio(ref_path, mic_path, os.path.join(out_dir, "out.wav"),
+                                profile=StageProfiler(trace_memory=False), **options)
+        error = _report_error(report["lag"], truth)
+        stages = {name: round(v["wall_s"], 4) for name, v in report["stages"].items()}
+
+    return {
+        "wall_s": time.perf_counter() - start_wall,
+        "cpu_s": time.process_time() - start_cpu,
+        "peak_rss_mb": _peak_rss_mb(),
+        "rss_before_mb": rss_before,
+        "alignment_error_samples": error,
+        "stages_wall_s": stages,
+    }
+
+
+def run_stage_isolated(stage, ref_path, mic_path, truth, out_dir):
+    try:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            return pool.submit(_run_stage, stage, ref_path, mic_path, truth, out_dir).result()
+    except BrokenProcessPool:
+        # 메모리 부족 등으로 프로세스가 종료된 경우
+        return {"error": "worker process terminated (out of memory?)"}
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+# endregion
+
+# region 결과 비교
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(old_path, new):
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+
+    old_map = {(r["stage"], r["seconds"], r["channels"]): r for r in old["results"]}
+    print(f"\n비교 기준: {old_path} ({old.get('commit')})")
+    print(f"{'stage':<20} {'case':>10} {'old(s)':>9} {'new(s)':>9} {'ratio':>7} {'old MB':>8} {'new MB':>8}")
+    for r in new["results"]:
+        o = old_map.get((r["stage"], r["seconds"], r["channels"]))
+        if o is None or "wall_s" not in o or "wall_s" not in r:
+            continue
+        case = f"{r['seconds']}s/{r['channels']}ch"
+        print(f"{r['stage']:<20} {case:>10} {o['wall_s']:>9.3f} {r['wall_s']:>9.3f} "
+              f"{r['wall_s'] / o['wall_s']:>6.2f}x {o['peak_rss_mb']:>8.0f} {r['peak_rss_mb']:>8.0f}")
+
+
+# endregion
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="오디오 정렬/정제 파이프라인 벤치마크")
+    parser.add_argument("--durations", type=float, nargs="+", default=[60, 600, 3600], help="원본 길이 (초)")
+    parser.add_argument("--channels", type=int, nargs="+", default=[1, 2], help="채널 수")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=list(STAGES))
+    parser.add_argument("--output", default="bench_results.json", help="결과 JSON 경로")
+    parser.add_argument("--compare", default=None, help="비교할 이전 결과 JSON 경로")
+    args = parser.parse_args()
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "results": [],
+    }
+
+    print(f"{'stage':<20} {'case':>10} {'wall(s)':>9} {'cpu(s)':>9} {'peak MB':>8} {'err':>5}")
+    with TemporaryDirectory() as temp_dir:
+        for seconds in args.durations:
+            seconds = int(seconds) if float(seconds).is_integer() else seconds
+            for channels in args.channels:
+                ref_path, mic_path, truth = write_pair(temp_dir, seconds, channels=channels)
+
+                for stage in args.stages:
+                    result = run_stage_isolated(stage, ref_path, mic_path, truth, temp_dir)
+                    result.update({"stage": stage, "seconds": seconds, "channels": channels})
+                    report["results"].append(result)
+
+                    case = f"{seconds}s/{channels}ch"
+                    if "error" in result:
+                        print(f"{stage:<20} {case:>10} {result['error']}")
+                    else:
+                        err = result["alignment_error_samples"]
+                        print(f"{stage:<20} {case:>10} {result['wall_s']:>9.3f} {result['cpu_s']:>9.3f} "
+                              f"{result['peak_rss_mb']:>8.0f} {'-' if err is None else err:>5}")
+
+                os.remove(ref_path)
+                os.remove(mic_path)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n결과 저장: {args.output}")
+
+    if args.compare:
+        compare_results(args.compare, report)
@@ -0,0 +1,72 @@
+# region Imports
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "features"))
+from audio_utils import refine_lag_robust  # noqa: E402
+from synthetic import make_pair  # noqa: E402
+
+# endregion
+
+
+# region 기존 순차 탐색 (비교 기준)
+def refine_lag_robust_loop(ref, mic, initial_lag, search_range=200, keep_ratio=0.7):
+    n_ref = len(ref)
+    center = initial_lag
+    lags = range(center - search_range, center + search_range + 1)
+
+    pad_size = abs(center) + search_range + 1000
+    mic_padded = np.pad(mic, (pad_size, pad_size), 'constant')
+
+    compare_len = min(n_ref, 16000 * 30)
+    ref_comp = ref[:compare_len]
+    k = int(compare_len * keep_ratio)
+
+    best_lag = center
+    min_error = float('inf')
+
+    for lag in lags:
+        start = pad_size + lag
+        end = start + compare_len
+        mic_view = mic_padded[start:end]
+
+        if len(mic_view) < compare_len: continue
+
+        diff = np.abs(mic_view - ref_comp)
+        partitioned = np.partition(diff, k)
+        err = np.sum(partitioned[:k])
+
+        if err < min_error:
+            min_error = err
+            best_lag = lag
+
+    return best_lag
+
+
+# endregion
+
+
+if __name__ == "__main__":
+    ref, mic = make_pair()
+    true_lag = 1234
+
+    # Numba 컴파일 / 캐시 로드 시간 제외
+    refine_lag_robust(ref, mic, true_lag, search_range=5)
+
+    print(f"{'range':>6} {'loop(s)':>9} {'new(s)':>9} {'speedup':>8} {'lag':>6} {'same':>5}")
+    for search_range in (25, 50, 100, 200, 400):
+        # GCC-PHAT 오차를 흉내 내기 위해 초기값을 약간 어긋나게 설정
+        initial_lag = true_lag + 7
+
+        start_time = time.perf_counter()
+        old = refine_lag_robust_loop(ref, mic, initial_lag, search_range=search_range)
+        t_old = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        new = refine_lag_robust(ref, mic, initial_lag, search_range=search_range)
+        t_new = time.perf_counter() - start_time
+
+        print(f"{search_range:>6} {t_old:>9.3f} {t_new:>9.3f} {t_old / t_new:>7.1f}x {new:>6} {str(old == new):>5}")
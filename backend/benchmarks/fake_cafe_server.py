@@ -0,0 +1,107 @@
+# region Imports
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# endregion
+
+# region 게시물 목록 데이터
+
+# 기록해 둔 목록 응답 (응답 JSON 목록 또는 게시물 목록)을 게시물 목록으로 변환 (최신순, 중복 제거)
+def load_recorded(path):
+    with open(path, encoding="utf-8") as f:
+        recorded = json.load(f)
+
+    articles = {}
+    for item in recorded:
+        page = item["message"]["result"]["articleList"] if "message" in item else [item]
+        for article in page:
+            articles[int(article["articleId"])] = article
+    return [articles[k] for k in sorted(articles, reverse=True)]
+
+
+# 합성 게시물 목록 (ratio 비율만 반응정리 팀 게시물)
+def synthetic_articles(n, member_key, ratio=0.3, first_id=100000):
+    articles = []
+    for i in range(n):
+        article_id = first_id + n - i
+        mine = (i * 7919) % 100 < ratio * 100
+        articles.append({
+            "articleId": article_id,
+            "subject": f"[테스트] 게시물 {article_id} 반응정리/💙" if mine else f"다른 게시물 {article_id}",
+            "memberKey": member_key if mine else "other",
+        })
+    return articles
+
+
+# endregion
+
+# region 가짜 네이버 카페 서버
+# search.page / search.perPage에 맞춰 목록을 잘라 응답 (페이지 크기를 바꿔도 같은 데이터로 재생)
+# latency: 요청마다 지연 (초) / fail_after: 이 수만큼 응답한 뒤로는 500 응답 (중단 후 이어가기 확인용)
+# HTTP/1.1 keep-alive를 지원하므로 connections로 클라이언트가 연결을 재사용했는지 확인
+class FakeCafeServer:
+    def __init__(self, articles, latency=0.05, fail_after=None):
+        self.articles = articles
+        self.latency = latency
+        self.fail_after = fail_after
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 헤더와 본문을 따로 보내므로 keep-alive 연결에서 Nagle 지연이 생기지 않도록 함
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                page = int(query.get("search.page", ["1"])[0])
+                per_page = int(query.get("search.perPage", ["10"])[0])
+
+                with server._lock:
+                    server.requests += 1
+                    failed = server.fail_after is not None and server.requests > server.fail_after
+                time.sleep(server.latency)
+
+                if failed:
+                    self.send_response(500)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                page_articles = server.articles[(page - 1) * per_page:page * per_page]
+                body = json.dumps({"message": {"result": {"articleList": page_articles}}}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/list"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+# endregion
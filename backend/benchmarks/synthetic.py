@@ -0,0 +1,109 @@
+# region Imports
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "features"))
+from audio_utils import WavWriter  # noqa: E402
+
+# endregion
+
+# region 절차적 신호 생성 (샘플 인덱스만으로 값이 정해지므로 블록 단위 생성 가능)
+
+# 인덱스 기반 의사 난수 (-1 ~ 1)
+def _hash_noise(idx, salt=0.0):
+    x = np.sin((idx.astype(np.float64) + salt) * 12.9898) * 43758.5453
+    return (x - np.floor(x)) * 2.0 - 1.0
+
+
+# 음악 (화음 + 하이햇) - 원본 샘플 인덱스 기준, 범위 밖은 0
+def music(idx, n_ref, fs, channel=0, seed=0):
+    beat_len = fs // 2
+    n_beats = n_ref // beat_len + 1
+    table = np.random.default_rng(seed).choice([220.0, 261.6, 329.6, 392.0, 440.0, 523.3, 659.3], (n_beats, 3))
+
+    valid = (idx >= 0) & (idx < n_ref)
+    idx = np.clip(idx, 0, n_ref - 1)
+    t = idx / fs
+
+    beat = idx // beat_len
+    env = np.exp(-(idx % beat_len) / fs * 3.0)
+    tone = np.zeros(len(idx))
+    for k in range(3):
+        tone += np.sin(2 * np.pi * table[beat, k] * t) * (0.8 if channel and k == 0 else 1.0)
+
+    hat = _hash_noise(idx, salt=17.0) * np.exp(-(idx % (beat_len // 2)) / fs * 40.0)
+    return ((tone * env * 0.15 + hat * 0.05) * valid).astype(np.float32)
+
+
+# 목소리 대용 (기본 주파수가 바뀌는 배음 + 음절 단위 on/off)
+def voice(idx, fs, seed=0):
+    syl_len = fs // 4
+    syl = idx // syl_len
+    on = _hash_noise(syl, salt=seed + 3.0) > 0.2
+    f0 = 150.0 + 50.0 * (_hash_noise(syl, salt=seed + 5.0) + 1.0)
+
+    t = idx / fs
+    env = np.sin(np.pi * (idx % syl_len) / syl_len)
+    harm = sum(np.sin(2 * np.pi * f0 * h * t) / h for h in range(1, 6))
+    return (harm * env * on * 0.25).astype(np.float32)
+
+
+# endregion
+
+# region 테스트 쌍 생성
+
+# 원본/반응 WAV 쌍 생성 (반응 = 지연된 음악 + 중간 일시정지(드리프트) + 목소리 + 잡음)
+def write_pair(out_dir, seconds, channels=2, fs=44100, lag_seconds=2.0, pause_seconds=0.5, noise=0.01, seed=0,
+               chunk_seconds=10):
+    n_ref = int(seconds * fs)
+    lag = int(lag_seconds * fs) + 17  # 샘플 단위 정밀도 확인용 오프셋
+    pause = int(pause_seconds * fs)
+    mid = lag + n_ref // 2
+    n_mic = n_ref + lag + pause
+    chunk = int(chunk_seconds * fs)
+
+    ref_path = os.path.join(out_dir, f"ref_{seconds}s_{channels}ch.wav")
+    mic_path = os.path.join(out_dir, f"mic_{seconds}s_{channels}ch.wav")
+
+    with WavWriter(ref_path, fs, channels) as writer:
+        for start in range(0, n_ref, chunk):
+            idx = np.arange(start, min(n_ref, start + chunk))
+            writer.write([music(idx, n_ref, fs, channel=ch, seed=seed) for ch in range(channels)])
+
+    rng = np.random.default_rng(seed + 1)
+    with WavWriter(mic_path, fs, channels) as writer:
+        for start in range(0, n_mic, chunk):
+            idx = np.arange(start, min(n_mic, start + chunk))
+
+            # 일시정지 전후로 지연값이 달라짐 (일시정지 구간은 음악 없음)
+            ref_idx = np.where(idx < mid, idx - lag, idx - lag - pause)
+            ref_idx[(idx >= mid) & (idx < mid + pause)] = -1
+
+            v = voice(idx, fs, seed=seed)
+            writer.write([
+                music(ref_idx, n_ref, fs, channel=ch, seed=seed) * 0.7 + v
+                + rng.standard_normal(len(idx)).astype(np.float32) * noise
+                for ch in range(channels)
+            ])
+
+    return ref_path, mic_path, {"fs": fs, "lags": [lag, lag + pause], "pause_at": mid}
+
+
+# 메모리 위에서 바로 쓰는 모노 쌍 (정밀 보정 벤치마크용)
+def make_pair(seconds=40, fs=44100, lag=1234, seed=0):
+    rng = np.random.default_rng(seed)
+    n = seconds * fs
+
+    music_sig = np.convolve(rng.standard_normal(n + lag), np.ones(8) / 8, mode='same').astype(np.float32)
+    ref = music_sig[lag:lag + n]
+
+    # 목소리 대용: 간헐적으로 켜지는 큰 잡음
+    voice_sig = rng.standard_normal(n).astype(np.float32) * 0.5
+    voice_sig *= (np.sin(np.arange(n) / fs * 2 * np.pi * 0.3) > 0.4)
+    mic = (music_sig[:n] * 0.8 + voice_sig + rng.standard_normal(n).astype(np.float32) * 0.01).astype(np.float32)
+    return ref, mic
+
+
+# endregion
@@ -1,61 +1,200 @@
 import asyncio
+import atexit
 import os
-import sqlite3
+import shutil
 import time
 import json
 import re
+import threading
 
-from flask import jsonify, send_file, send_from_directory, Blueprint, request
+from urllib.parse import quote
+
+from flask import jsonify, send_file, send_from_directory, Blueprint, request, Response, stream_with_context
 
 from features import *
+from features.http_client import run_event_loop, stop_event_loop
+from features.zip_stream import open_bundle, cleanup_stale_dirs
 
 main = Blueprint("main", __name__, url_prefix="/api")
-progress_list = []
 
-async def fetch_data():
-    if not os.path.exists("./database/posted_link.db"):
-        await CrawlService().checkForNewPosts(100)
+# 정렬 단계별 측정 결과 (게시글 id -> {제목: 보고서}) - ALIGN_PROFILE=1일 때만 기록
+profile_reports = {}
+
+
+# 다운로드 작업 실행 (진행 상황은 작업별로 따로 기록)
+async def run_download_job(job):
+    reports = profile_reports.setdefault(job.article_id, {}) if os.getenv("ALIGN_PROFILE") == "1" else None
+    try:
+        await DownloadAudio(job.publish, reports).download_audio(job.article_id, job.id)
+    finally:
+        # 받아가지 않은 오래된 작업 폴더 정리 (진행 중인 작업, 전송 중인 폴더는 제외)
+        with bundle_streams_lock:
+            streaming = set(bundle_streams)
+        await asyncio.to_thread(cleanup_stale_dirs, VIDEO_DIR, BUNDLE_MAX_AGE, job_manager.active_ids(), streaming)
+
+
+# 작업 폴더 위치와 전송되지 않은 묶음 보관 시간 (초)
+VIDEO_DIR = "./video"
+BUNDLE_MAX_AGE = int(os.getenv("BUNDLE_MAX_AGE", str(24 * 3600)))
+
+# 동시에 실행할 다운로드 작업 수 (DOWNLOAD_WORKERS 환경 변수로 설정)
+job_manager = JobManager(run_download_job, max_workers=int(os.getenv("DOWNLOAD_WORKERS", "2")))
+atexit.register(job_manager.shutdown)
 
-    db_conn = sqlite3.connect("./database/posted_link.db")
-    db_cur = db_conn.cursor()
-    db_cur.execute("SELECT * FROM posted_link ORDER BY link DESC")
-    db_list = db_cur.fetchall()
-    db_conn.close()
+# 한 번에 보낼 수 있는 최대 게시물 수
+MAX_PAGE_SIZE = 200
 
-    title_dict = {}
 
-    for item in db_list:
-        s = process_title(item[1])
-        if not bool(re.search(r"[가-힣A-Za-z]", s[1])):
-            title_dict[item[0]] = s
+# 목록 데이터 (DB가 없으면 먼저 크롤링) -> (ETag, JSON 바이트)
+# page가 없으면 전체 목록, 있으면 (before, limit, q, viewer) 조건의 한 페이지
+async def fetch_data(page=None):
+    if not os.path.exists(POSTED_LINK_DB):
+        await CrawlService().check_new_posts(100)
 
-    return title_dict
+    if page is None:
+        return get_article_list_cache().get()
+    return get_article_list_cache().page(*page)
+
+
+# 요청 처리에서 쓰는 비동기 작업은 하나의 이벤트 루프에서 실행
+# (요청 스레드마다 루프를 만들면 공유 HTTP 클라이언트의 연결을 요청 사이에 재사용할 수 없음)
+# 종료 시 루프를 멈추면서 공유 HTTP 클라이언트의 연결도 닫음
+api_loop = asyncio.new_event_loop()
+api_thread = threading.Thread(target=run_event_loop, args=(api_loop,), name="api-loop", daemon=True)
+api_thread.start()
+atexit.register(stop_event_loop, api_loop, api_thread)
 
 
 def run_async_task(coro):
-    try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-    return loop.run_until_complete(coro)
+    return asyncio.run_coroutine_threadsafe(coro, api_loop).result()
+
+
+# 최근 게시물 크롤링 (DB 연결이 루프 스레드에서 만들어지도록 코루틴 안에서 생성)
+async def refresh_posts():
+    await CrawlService().crawl_until_known()
 
 
 # 데이터 요청 이벤트
+# - limit / before / q / viewer 중 하나라도 있으면 최신순 페이지 응답 ({"items": [...], "next_cursor": ...})
 @main.route("/data", methods=["GET"])
 def send_data():
-    data = run_async_task(fetch_data())
-    return jsonify(data)
+    page = None
+    if any(key in request.args for key in ("limit", "before", "q", "viewer")):
+        try:
+            limit = min(max(int(request.args.get("limit", "50")), 1), MAX_PAGE_SIZE)
+            before = request.args.get("before")
+            before = int(before) if before else None
+        except ValueError:
+            return jsonify({"error": "Invalid limit or before"}), 400
+        page = (before, limit, request.args.get("q", ""), request.args.get("viewer", ""))
+
+    # 목록이 바뀌지 않았으면 캐시된 JSON을 그대로 사용 (If-None-Match가 같으면 304)
+    etag, body = run_async_task(fetch_data(page))
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
 
 
-# 다운로드 이벤트
+# Range 헤더 해석 -> (start, stop) / 범위가 없으면 None / 잘못된 범위는 False
+def parse_range(header, size):
+    match = re.match(r"^bytes=(\d*)-(\d*)$", (header or "").strip())
+    if match is None or match.groups() == ("", ""):
+        return None
+
+    first, last = match.groups()
+    if first == "":
+        start, stop = max(0, size - int(last)), size
+    else:
+        start, stop = int(first), size if last == "" else min(size, int(last) + 1)
+    return (start, stop) if start < stop else False
+
+
+# 작업 폴더별 전송 중인 응답 수
+bundle_streams = {}
+bundle_streams_lock = threading.Lock()
+
+
+# 응답 종료 처리 -> 작업 폴더를 지워도 되면 True
+# (요청한 사용자 수만큼 전체 전송 (200)이 끝났고 같은 폴더를 읽는 다른 응답이 없을 때만)
+# 부분 (Range) 전송만으로는 다른 구간이 남아 있을 수 있으므로 지우지 않고 보관 시간이 지나면 정리
+def finish_bundle_stream(work_dir: str, job, full_transfer: bool) -> bool:
+    with bundle_streams_lock:
+        bundle_streams[work_dir] -= 1
+        if bundle_streams[work_dir] == 0:
+            del bundle_streams[work_dir]
+
+        if job is None:
+            delivered = full_transfer
+        else:
+            job.deliveries += int(full_transfer)
+            delivered = job.finished and job.deliveries >= job.requesters
+        return delivered and work_dir not in bundle_streams
+
+
+# 다운로드 이벤트 (완성된 묶음을 무압축 ZIP으로 바로 생성하여 전송, 이어받기 지원)
+# job_id가 있으면 ./video/<게시글 id>/<작업 id>의 묶음, 전체 전송이 끝나면 서버에서 작업 폴더 삭제
 @main.route("/download/<zip_name>", methods=["GET"])
-def download_zip(zip_name):
-    zip_path = os.path.join(os.path.abspath("./video"), zip_name)
-    if os.path.exists(zip_path):
+@main.route("/download/<job_id>/<zip_name>", methods=["GET"])
+def download_zip(zip_name, job_id=None):
+    zip_path = os.path.join(os.path.abspath(VIDEO_DIR), zip_name)
+    if job_id is None and os.path.isfile(zip_path):
         return send_file(zip_path, as_attachment=True, mimetype="application/zip")
-    else:
-        return jsonify({"message": "File not found"})
+
+    article_id = os.path.splitext(zip_name)[0]
+    if not re.fullmatch(r"\w+", article_id) or (job_id is not None and not re.fullmatch(r"\w+", job_id)):
+        return jsonify({"message": "File not found"}), 404
+
+    work_dir = os.path.join(os.path.abspath(VIDEO_DIR), article_id, *([job_id] if job_id else []))
+    archive = open_bundle(os.path.join(work_dir, "bundle"))
+    if archive is None:
+        return jsonify({"message": "File not found"}), 404
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{archive.etag}"',
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(zip_name)}",
+    }
+
+    # If-Range가 다르면 (묶음이 바뀌었으면) 처음부터 전송
+    byte_range = None
+    if request.headers.get("If-Range", f'"{archive.etag}"') == f'"{archive.etag}"':
+        byte_range = parse_range(request.headers.get("Range"), archive.size)
+    if byte_range is False:
+        headers["Content-Range"] = f"bytes */{archive.size}"
+        return Response(status=416, headers=headers)
+
+    start, stop = byte_range or (0, archive.size)
+    if byte_range is not None:
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{archive.size}"
+    headers["Content-Length"] = str(stop - start)
+
+    job = job_manager.get(job_id) if job_id else None
+    with bundle_streams_lock:
+        bundle_streams[work_dir] = bundle_streams.get(work_dir, 0) + 1
+
+    # 연결이 끊기면 completed가 거짓이므로 이어받기가 가능하도록 파일이 남음
+    state = {"completed": False}
+
+    def generate():
+        yield from archive.iter_range(start, stop)
+        state["completed"] = True
+
+    response = Response(generate(), status=206 if byte_range else 200, mimetype="application/zip", headers=headers,
+                        direct_passthrough=True)
+
+    # 응답이 끝나면 (전송하지 못하고 닫힌 경우 포함) 항상 호출
+    @response.call_on_close
+    def on_close():
+        if finish_bundle_stream(work_dir, job, state["completed"] and byte_range is None):
+            shutil.rmtree(work_dir, ignore_errors=True)
+            if job_id is not None:
+                try:
+                    os.rmdir(os.path.dirname(work_dir))
+                except OSError:
+                    pass
+
+    return response
 
 
 # 파일 삭제 이벤트
@@ -77,28 +216,81 @@ def delete_file(filename):
 @main.route("/refresh", methods=["GET"])
 def get_refresh():
     try:
-        run_async_task(CrawlService().crawl_until_known())
+        run_async_task(refresh_posts())
         return jsonify({"message": "Refreshed successfully"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-# 다운로드 신호 이벤트
+# 다운로드 신호 이벤트 (작업을 등록하고 바로 작업 id 반환)
 @main.route("/download_signal/<filename>")
 def handle_signal(filename):
     if filename is None:
         return jsonify({"error": "JSON 데이터가 올바르지 않습니다."}), 400
 
-    try:
-        run_async_task(DownloadAudio(progress_list).download_audio(filename))
-        progress_list.clear()  # 다운로드 후 progress_list 초기화
+    job, created = job_manager.submit(filename)
+    return jsonify({"job_id": job.id, "status": job.status, "created": created}), 202
 
-    except Exception as e:
-        print(e)
-        return jsonify({"error": str(e)}), 500
 
-    return jsonify({"message": "Downloaded successfully"}), 200
+# 작업 상태 및 진행 상황 스냅샷 (since: 이미 받은 진행 메시지 수)
+@main.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": f"{job_id} not found"}), 404
+    return jsonify(job.to_dict(since=request.args.get("since", 0, type=int)))
+
+
+# SSE 연결 유지용 주석 전송 간격 (초)
+SSE_KEEPALIVE = 15
+
+
+def _sse(event: str, data: dict, event_id: int = None) -> str:
+    message = f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return message if event_id is None else f"id: {event_id}\n{message}"
+
+
+# 작업 진행 이벤트 스트림 (Server-Sent Events) - 새 이벤트만 전송하고 작업이 끝나면 status 이벤트 후 종료
+# 재연결 시 브라우저가 보내는 Last-Event-ID 이후부터 이어서 전송
+@main.route("/jobs/<job_id>/events", methods=["GET"])
+def stream_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": f"{job_id} not found"}), 404
+
+    since = request.headers.get("Last-Event-ID", type=int) or request.args.get("since", 0, type=int)
+
+    def generate():
+        sent = since
+        yield _sse("status", {"status": job.status, "error": job.error})
+        while True:
+            events = job.progress.wait(sent, lambda: job.finished, SSE_KEEPALIVE)
+            for event in events:
+                yield _sse("progress", event, event_id=event["seq"])
+            sent += len(events)
+
+            if job.finished and sent >= len(job.progress):
+                yield _sse("status", {"status": job.status, "error": job.error})
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=headers)
+
+
+# 저장된 정렬 결과 삭제 (ref_hash / mic_hash를 주면 해당 결과만)
+@main.route("/alignment_cache", methods=["DELETE"])
+def clear_alignment_cache():
+    deleted = get_alignment_store().invalidate(
+        ref_hash=request.args.get("ref_hash"), mic_hash=request.args.get("mic_hash")
+    )
+    return jsonify({"deleted": deleted}), 200
+
 
-@main.route("/progress", methods=["GET"])
-def get_progress():
-    return jsonify(progress_list)
+# 정렬 측정 결과 조회
+@main.route("/profile/<filename>", methods=["GET"])
+def get_profile(filename):
+    if filename not in profile_reports:
+        return jsonify({"error": f"{filename} not found"}), 404
+    return jsonify(profile_reports[filename])
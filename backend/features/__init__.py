@@ -1,2 +1,6 @@
-from .crawlService import CrawlService
-from .download_audio import DownloadAudio, process_title
\ No newline at end of file
+from .crawlService import CrawlService, connect_posted_link_db, POSTED_LINK_DB
+from .download_audio import DownloadAudio
+from .titles import process_title
+from .article_list import get_article_list_cache
+from .job_manager import JobManager
+from .alignment_store import get_alignment_store
\ No newline at end of file
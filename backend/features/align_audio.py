@@ -1,17 +1,44 @@
 import numpy as np
 import scipy.io.wavfile as wav
 from scipy import signal
+from scipy import fft as sp_fft
 import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import nullcontext
 from numba import jit  # Numba 임포트
-from audio_utils import robust_normalize, calculate_gcc_phat, refine_lag_robust, align_ref_to_mic_canvas
+
+try:
+    from .audio_utils import calculate_gcc_phat, calculate_gcc_phat_multires, refine_lag_robust, estimate_lag_map, \
+        align_ref_to_mic_canvas, align_ref_to_mic_canvas_map, array_block_reader, aligned_block_reader, \
+        create_shared_array, attach_shared_array, release_shared_array, lag_confidence, open_audio, WavWriter, \
+        FfmpegMuxWriter, audio_sample_rate
+    from .alignment_store import file_fingerprint, get_alignment_store
+    from .compute_pool import get_compute_pool
+    from .profiling import StageProfiler, NULL_PROFILER
+except ImportError:
+    # 스크립트로 직접 실행하는 경우 (python align_audio.py)
+    from audio_utils import calculate_gcc_phat, calculate_gcc_phat_multires, refine_lag_robust, estimate_lag_map, \
+        align_ref_to_mic_canvas, align_ref_to_mic_canvas_map, array_block_reader, aligned_block_reader, \
+        create_shared_array, attach_shared_array, release_shared_array, lag_confidence, open_audio, WavWriter, \
+        FfmpegMuxWriter, audio_sample_rate
+    from alignment_store import file_fingerprint, get_alignment_store
+    from compute_pool import get_compute_pool
+    from profiling import StageProfiler, NULL_PROFILER
+
+# region 위너 필터 설정
+
+# 고해상도 설정
+N_FFT = 4096
+HOP_LENGTH = 512 #128
+
+# 스트리밍 처리 시 한 블록에 들어가는 STFT 프레임 수 (블록 길이 = 프레임 수 * HOP_LENGTH)
+BLOCK_FRAMES = 256
+
+# endregion
 
 # region 배경음 제거 함수
 
 def wiener_filter_soft(ref, mic, alpha, beta):
-    # 고해상도 설정
-    N_FFT = 4096
-    HOP_LENGTH = 512 #128
-
     f, t, Z_ref = signal.stft(ref, nperseg=N_FFT, noverlap=N_FFT - HOP_LENGTH)
     _, _, Z_mic = signal.stft(mic, nperseg=N_FFT, noverlap=N_FFT - HOP_LENGTH)
 
@@ -32,22 +59,98 @@ def wiener_filter_soft(ref, mic, alpha, beta):
     return clean_audio
 
 
+# region 블록 스트리밍 위너 필터
+
+# 프레임 단위 마스크 계산 (wiener_filter_soft와 동일한 수식)
+def _wiener_mask_frames(ref_frames, mic_frames, window, win_sum, alpha, beta):
+    Z_ref = sp_fft.rfft(ref_frames * window, axis=-1) / win_sum
+    Z_mic = sp_fft.rfft(mic_frames * window, axis=-1) / win_sum
+
+    P_ref = np.abs(Z_ref) ** 2
+    P_mic = np.abs(Z_mic) ** 2 + 1e-12
+
+    P_estimated = np.maximum(P_mic - (alpha * P_ref), P_mic * beta)
+    Z_mic *= np.sqrt(P_estimated / P_mic)
+
+    return sp_fft.irfft(Z_mic, n=window.shape[0], axis=-1) * win_sum
+
+
+# 출력 구간 [start, stop)에 대한 STFT -> 마스크 -> ISTFT (overlap-add)
+def wiener_filter_block(ref_read, mic_read, n_samples, start, stop, alpha, beta,
+                        n_fft=N_FFT, hop=HOP_LENGTH):
+    half = n_fft // 2
+    n_frames = -(-n_samples // hop) + 1  # scipy.signal.stft(padded=True)와 같은 프레임 수
+
+    # 출력 구간에 겹치는 프레임 범위
+    k_lo = max(0, (start - half) // hop + 1)
+    k_hi = min(n_frames - 1, -(-(stop + half) // hop) - 1)
+    nf = k_hi - k_lo + 1
+
+    # 프레임들이 덮는 입력 구간 (경계 밖은 0으로 채워짐)
+    seg_start = k_lo * hop - half
+    seg_stop = k_hi * hop + half
+    ref_seg = ref_read(seg_start, seg_stop)
+    mic_seg = mic_read(seg_start, seg_stop)
+
+    window = signal.get_window("hann", n_fft).astype(np.float32)
+    win_sum = window.sum()
+
+    ref_frames = np.lib.stride_tricks.sliding_window_view(ref_seg, n_fft)[::hop]
+    mic_frames = np.lib.stride_tricks.sliding_window_view(mic_seg, n_fft)[::hop]
+    clean_frames = _wiener_mask_frames(ref_frames, mic_frames, window, win_sum, alpha, beta)
+    clean_frames *= window
+
+    # overlap-add (hop 단위 위상별로 한 번에 누적)
+    out = np.zeros(seg_stop - seg_start, dtype=np.float32)
+    norm = np.zeros(seg_stop - seg_start, dtype=np.float32)
+    win_sq = window ** 2
+    for j in range(n_fft // hop):
+        out[j * hop: j * hop + nf * hop] += clean_frames[:, j * hop:(j + 1) * hop].reshape(-1)
+        norm[j * hop: j * hop + nf * hop] += np.tile(win_sq[j * hop:(j + 1) * hop], nf)
+
+    out = out[start - seg_start: stop - seg_start]
+    norm = norm[start - seg_start: stop - seg_start]
+    out /= np.where(norm > 1e-10, norm, 1.0)
+    return out
+
+
+# 블록 단위로 정제된 오디오를 순서대로 생성 (메모리 사용량은 입력 길이와 무관)
+def wiener_filter_stream(ref_read, mic_read, n_samples, alpha, beta, block_size=BLOCK_FRAMES * HOP_LENGTH):
+    # 블록 경계를 hop 배수로 맞춰 프레임 재계산을 최소화
+    block_size = max(HOP_LENGTH, block_size - block_size % HOP_LENGTH)
+
+    for start in range(0, n_samples, block_size):
+        stop = min(n_samples, start + block_size)
+        yield start, wiener_filter_block(ref_read, mic_read, n_samples, start, stop, alpha, beta)
+
+
+# endregion
+
 # endregion
 
 # region 후처리 함수
 
 # region 파이썬 -> 기계어 함수
 
+# 엔벨로프 추적 -> 게인 계산 -> 이동 평균 스무딩 -> 출력 기록을 한 번에 처리하는 블록 커널
+# state: [현재 엔벨로프, 현재 게인, 이동 평균 누적합, 처리한 샘플 수]
+# 이동 평균은 np.convolve(mode='same')와 같도록 (kernel_size - 1) // 2 샘플 늦게 출력됨
 @jit(nopython=True, cache=True)
-def _calculate_gain_curve_jit(abs_audio, threshold_linear, ratio, gain_decay, env_decay):
-    n_samples = len(abs_audio)
-    gain_curve = np.zeros(n_samples, dtype=np.float32)
-    current_env = 0.0
-    current_gain = 1.0
+def _expander_block_jit(block, out, state, gain_ring, audio_ring, threshold_linear, ratio, gain_decay, env_decay):
+    kernel_size = len(gain_ring)
+    delay = len(audio_ring) - 1
+
+    current_env = state[0]
+    current_gain = state[1]
+    running_sum = state[2]
+    t = int(state[3])
+    n_out = 0
+
+    for j in range(len(block)):
+        x = block[j]
 
-    for i in range(n_samples):
         # 엔벨로프 추적 (빠른 반응)
-        val = abs_audio[i]
+        val = abs(x)
         if val > current_env:
             current_env = val
         else:
@@ -66,129 +169,573 @@ def _calculate_gain_curve_jit(abs_audio, threshold_linear, ratio, gain_decay, en
             current_gain = current_gain * gain_decay  # Release
             if current_gain < ratio: current_gain = ratio
 
-        gain_curve[i] = current_gain
+        # 팝 노이즈 방지용 이동 평균 (누적합 갱신)
+        g = np.float32(current_gain)
+        slot = t % kernel_size
+        running_sum += g - gain_ring[slot]
+        gain_ring[slot] = g
+
+        # 지연된 샘플 출력 (입력을 먼저 보관하므로 block과 out이 같아도 안전)
+        audio_ring[t % (delay + 1)] = x
+        if t >= delay:
+            out[n_out] = audio_ring[(t - delay) % (delay + 1)] * (running_sum / kernel_size)
+            n_out += 1
+        t += 1
+
+    state[0] = current_env
+    state[1] = current_gain
+    state[2] = running_sum
+    state[3] = t
+    return n_out
+
+
+# 입력 끝 이후를 게인 0으로 보고 남은 지연 샘플 출력
+@jit(nopython=True, cache=True)
+def _expander_flush_jit(out, state, gain_ring, audio_ring):
+    kernel_size = len(gain_ring)
+    delay = len(audio_ring) - 1
+
+    running_sum = state[2]
+    t = int(state[3])
+    n_out = 0
+
+    for i in range(max(0, t - delay), t):
+        slot = (i + delay) % kernel_size
+        running_sum -= gain_ring[slot]
+        gain_ring[slot] = 0.0
+        out[n_out] = audio_ring[i % (delay + 1)] * (running_sum / kernel_size)
+        n_out += 1
+
+    state[2] = running_sum
+    return n_out
 
-    return gain_curve
 
 # endregion
 
-def apply_soft_expander(audio, threshold_db=-45.0, ratio=0.2, release_ms=400, fs=48000):
-    threshold_linear = 10 ** (threshold_db / 20)
+# 블록 단위로 이어서 처리할 수 있는 소프트 익스팬더 (블록 경계에서 상태가 이어짐)
+class SoftExpander:
+    def __init__(self, threshold_db=-45.0, ratio=0.2, release_ms=400, fs=48000, kernel_size=500):
+        self.threshold_linear = 10 ** (threshold_db / 20)
+        self.ratio = ratio
 
+        # 감쇠 계수 계산 (문 닫는 속도)
+        if release_ms > 0:
+            release_samples = int((release_ms / 1000) * fs)
+            self.gain_decay = np.exp(-1.0 / release_samples)
+        else:
+            self.gain_decay = 0.0
+
+        # 엔벨로프 추적용 감쇠 계수 (센서 반응 속도 - 10ms 고정)
+        self.env_decay = np.exp(-1.0 / (fs * 0.01))
+
+        self.delay = (kernel_size - 1) // 2
+        self.state = np.array([0.0, 1.0, 0.0, 0.0])
+        self.gain_ring = np.zeros(kernel_size, dtype=np.float32)
+        self.audio_ring = np.zeros(self.delay + 1, dtype=np.float32)
+
+    # 블록 처리 (out에 기록된 출력만 반환, 첫 블록은 delay 샘플만큼 짧음 / out=block이면 제자리 처리)
+    def process(self, block, out=None):
+        block = np.asarray(block, dtype=np.float32)
+        if out is None:
+            out = np.empty(len(block), dtype=np.float32)
+        n = _expander_block_jit(block, out, self.state, self.gain_ring, self.audio_ring,
+                                self.threshold_linear, self.ratio, self.gain_decay, self.env_decay)
+        return out[:n]
+
+    # 입력이 끝난 뒤 남은 지연 샘플 출력
+    def flush(self, out=None):
+        if out is None:
+            out = np.empty(self.delay, dtype=np.float32)
+        n = _expander_flush_jit(out, self.state, self.gain_ring, self.audio_ring)
+        return out[:n]
+
+
+def apply_soft_expander(audio, threshold_db=-45.0, ratio=0.2, release_ms=400, fs=48000, out=None):
     # Numba 처리를 위해 float32 타입 보장
-    abs_audio = np.abs(audio).astype(np.float32)
+    audio = np.asarray(audio, dtype=np.float32)
+    if out is None:
+        out = np.empty(len(audio), dtype=np.float32)
 
-    # 감쇠 계수 계산 (문 닫는 속도)
-    if release_ms > 0:
-        release_samples = int((release_ms / 1000) * fs)
-        gain_decay = np.exp(-1.0 / release_samples)
-    else:
-        gain_decay = 0.0
+    # 한 번의 순회로 게인 계산, 스무딩, 출력 기록 (out=audio이면 추가 할당 없음)
+    expander = SoftExpander(threshold_db=threshold_db, ratio=ratio, release_ms=release_ms, fs=fs)
+    n = len(expander.process(audio, out=out))
+    expander.flush(out=out[n:])
 
-    # 엔벨로프 추적용 감쇠 계수 (센서 반응 속도 - 10ms 고정)
-    env_decay = np.exp(-1.0 / (fs * 0.01))
+    return out
 
-    # [변경] 분리된 Numba JIT 함수 호출 (속도 가속 구간)
-    gain_curve = _calculate_gain_curve_jit(abs_audio, threshold_linear, ratio, gain_decay, env_decay)
 
-    # 팝 노이즈 방지용 추가 스무딩 (Numpy Convolve는 이미 빠르므로 유지)
-    kernel_size = 500
-    gain_curve_smooth = np.convolve(gain_curve, np.ones(kernel_size) / kernel_size, mode='same')
+# endregion
 
-    return audio * gain_curve_smooth
+# region 병렬 처리 함수
 
+# 작업 인자가 공유 메모리 spec (튜플)이면 연결하고, 아니면 그대로 사용 (스레드 모드)
+def _open_array(obj):
+    if not isinstance(obj, tuple):
+        return None, obj
+    return attach_shared_array(obj)
+
+
+# 한 채널의 [start, stop) 구간에 위너 필터 적용 후 출력 배열에 직접 기록
+def _wiener_block_task(ref_obj, mic_obj, out_obj, ref_idx, ch, lag, start, stop, alpha, beta):
+    ref_shm, ref = _open_array(ref_obj)
+    mic_shm, mic = _open_array(mic_obj)
+    out_shm, out = _open_array(out_obj)
+    try:
+        n = len(mic[ch])
+        ref_read = aligned_block_reader(ref[ref_idx], n, lag)
+        mic_read = array_block_reader(mic[ch])
+        out[ch, start:stop] = wiener_filter_block(ref_read, mic_read, n, start, stop, alpha, beta)
+    finally:
+        del ref, mic, out
+        for shm in (ref_shm, mic_shm, out_shm):
+            if shm is not None:
+                release_shared_array(shm)
+
+
+# 한 채널 전체에 익스팬더 적용 (엔벨로프 상태가 이어지므로 채널 단위로 분배)
+def _expander_task(out_obj, ch, fs):
+    out_shm, out = _open_array(out_obj)
+    try:
+        apply_soft_expander(out[ch], threshold_db=-45.0, ratio=0.2, release_ms=400, fs=fs, out=out[ch])
+    finally:
+        del out
+        if out_shm is not None:
+            release_shared_array(out_shm)
+
+
+# 채널 및 시간 블록을 작업 풀에 분배하여 처리
+# executor: "thread" (스레드 풀), "shared" (미리 준비된 공유 작업 풀 - 작업 풀 밖의 프로세스에서만 사용)
+# (호출마다 새 spawn 프로세스 풀을 만들면 프로세스 시작과 모듈 로드 비용이 계산보다 커서 사용하지 않음)
+def process_channels_parallel(ref_channels, mic_channels, lag, fs, alpha, beta, workers,
+                              block_size=BLOCK_FRAMES * HOP_LENGTH, executor="thread"):
+    block_size = max(HOP_LENGTH, block_size - block_size % HOP_LENGTH)
+    n_ch = len(mic_channels)
+    n = len(mic_channels[0])
+
+    # 같은 원본 채널이 복제된 경우 한 번만 저장
+    ref_unique = []
+    ref_index = []
+    for ref_ch in ref_channels:
+        for j, r in enumerate(ref_unique):
+            if r is ref_ch:
+                ref_index.append(j)
+                break
+        else:
+            ref_index.append(len(ref_unique))
+            ref_unique.append(ref_ch)
+
+    shms = []
+    try:
+        if executor == "shared":
+            ref_shm, ref_arr, ref_obj = create_shared_array((len(ref_unique), len(ref_unique[0])))
+            mic_shm, mic_arr, mic_obj = create_shared_array((n_ch, n))
+            out_shm, out_arr, out_obj = create_shared_array((n_ch, n))
+            shms = [ref_shm, mic_shm, out_shm]
+            # 지연 뷰 채널도 받을 수 있도록 블록 단위로 복사
+            for dst, src in [(ref_arr[j], r) for j, r in enumerate(ref_unique)] + \
+                            [(mic_arr[ch], m) for ch, m in enumerate(mic_channels)]:
+                for start in range(0, len(src), block_size):
+                    dst[start:start + block_size] = src[start:start + block_size]
+            # 공유 작업 풀은 다른 작업도 사용하므로 닫지 않음
+            pool = get_compute_pool().executor
+            scope = nullcontext()
+        elif executor == "thread":
+            # NumPy/SciPy FFT는 GIL을 해제하므로 스레드끼리 같은 채널 (배열 또는 지연 뷰)을 공유
+            ref_obj = list(ref_unique)
+            mic_obj = list(mic_channels)
+            out_arr = out_obj = np.empty((n_ch, n), dtype=np.float32)
+            pool = scope = ThreadPoolExecutor(max_workers=workers)
+        else:
+            raise ValueError(f"지원하지 않는 실행 방식입니다: {executor}")
+
+        with scope:
+            # 1단계: (채널, 블록) 단위 위너 필터
+            futures = [
+                pool.submit(_wiener_block_task, ref_obj, mic_obj, out_obj, ref_index[ch], ch, lag,
+                            start, min(n, start + block_size), alpha, beta)
+                for ch in range(n_ch)
+                for start in range(0, n, block_size)
+            ]
+            wait(futures)
+            for f in futures:
+                f.result()
+
+            # 2단계: 채널 단위 익스팬더
+            futures = [pool.submit(_expander_task, out_obj, ch, fs) for ch in range(n_ch)]
+            for f in futures:
+                f.result()
+
+        return [out_arr[ch].copy() for ch in range(n_ch)]
+    finally:
+        for shm in shms:
+            release_shared_array(shm, unlink=True)
 
-# endregion
 
 # endregion
 
 # region 메인 함수
 
-def align_audio(ref_path, mic_path, out_path, alpha=0.5, beta=0.2):
-    if not os.path.exists(ref_path):
-        raise FileNotFoundError(f"원본 파일을 찾을 수 없습니다: {ref_path}")
+# 정제 결과 기록 (video_path가 주어지면 WAV 대신 ffmpeg 파이프로 영상과 바로 병합)
+def open_output(out_path, fs, n_channels, video_path=None):
+    if video_path is None:
+        return WavWriter(out_path, fs, n_channels)
+    return FfmpegMuxWriter(video_path, out_path, fs, n_channels)
+
+
+# 위너 필터 -> 익스팬더 -> WAV 기록을 블록 단위로 이어서 처리 (채널은 같은 블록을 나란히 진행)
+def clean_to_wav_stream(out_path, fs, ref_channels, mic_channels, lag, alpha, beta, block_size,
+                        profiler=NULL_PROFILER, video_path=None):
+    n = len(mic_channels[0])
+    streams = zip(*[
+        wiener_filter_stream(aligned_block_reader(ref_ch, n, lag), array_block_reader(mic_ch), n, alpha, beta,
+                             block_size)
+        for ref_ch, mic_ch in zip(ref_channels, mic_channels)
+    ])
+    expanders = [SoftExpander(threshold_db=-45.0, ratio=0.2, release_ms=400, fs=fs) for _ in mic_channels]
+
+    with open_output(out_path, fs, len(mic_channels), video_path) as writer:
+        while True:
+            # 단계별 시간은 블록마다 합산됨
+            with profiler.stage("wiener"):
+                blocks = next(streams, None)
+            if blocks is None:
+                break
+            with profiler.stage("expander"):
+                cleaned = [exp.process(block, out=block) for exp, (_, block) in zip(expanders, blocks)]
+            with profiler.stage("write"):
+                writer.write(cleaned)
+
+        with profiler.stage("expander"):
+            cleaned = [exp.flush() for exp in expanders]
+        with profiler.stage("write"):
+            writer.write(cleaned)
+
+    return out_path
+
+
+# WAV 파일은 메모리 맵, 영상 파일은 ffmpeg 파이프로 열기 (정규화된 모노 / 채널은 필요한 구간만 지연 변환)
+def load_track(path):
+    return open_audio(path)
+
+
+# 원본 분석 결과 캐시 (여러 반응 영상을 같은 원본에 맞출 때 한 번만 계산)
+class ReferenceTrack:
+    # rfft 캐시 최대 개수 (반응 영상 길이마다 FFT 크기가 달라질 수 있음)
+    MAX_FFT_CACHE = 2
+
+    # mono: 미리 변환해 둔 정규화 모노 신호 (캐시의 메모리 맵 등, 없으면 원본에서 변환)
+    # mono가 주어지면 원본 파일은 채널이 처음 필요할 때 (정제 단계) 열림
+    def __init__(self, ref_path, mono=None):
+        if not os.path.exists(ref_path):
+            raise FileNotFoundError(f"원본 파일을 찾을 수 없습니다: {ref_path}")
+
+        self.path = ref_path
+        self._source = None
+
+        # 정렬용 모노 신호는 여러 반응 영상에서 재사용하므로 한 번만 변환하여 보관
+        self.mono = mono
+        if mono is None:
+            self.fs = self.source.fs
+            self.mono = np.asarray(self.source.mono())
+        else:
+            self.fs = audio_sample_rate(ref_path)
+        self._fft_cache = {}
+        self._coarse_cache = {}
+        self._fingerprint = None
+
+    @property
+    def source(self):
+        if self._source is None:
+            source = load_track(self.path)
+            if self.mono is not None and len(self.mono) != source.n_samples:
+                raise ValueError(f"모노 신호 길이가 원본과 다릅니다. ({len(self.mono)} != {source.n_samples})")
+            self._source = source
+        return self._source
+
+    # 원본 파일 지문 (정렬 결과 저장소 키)
+    def fingerprint(self):
+        if self._fingerprint is None:
+            self._fingerprint = file_fingerprint(self.path)
+        return self._fingerprint
+
+    # GCC-PHAT용 원본 rfft (FFT 크기별 캐시)
+    def rfft(self, n_fft):
+        if n_fft not in self._fft_cache:
+            if len(self._fft_cache) >= self.MAX_FFT_CACHE:
+                self._fft_cache.pop(next(iter(self._fft_cache)))
+            self._fft_cache[n_fft] = np.fft.rfft(self.mono, n=n_fft)
+        return self._fft_cache[n_fft]
+
+    # 다중 해상도 GCC-PHAT용 데시메이션 원본 (배율별 캐시)
+    def decimated(self, coarse_fs):
+        q = max(1, int(self.fs // coarse_fs))
+        if q not in self._coarse_cache:
+            self._coarse_cache[q] = signal.resample_poly(self.mono, 1, q).astype(np.float32)
+        return self._coarse_cache[q]
+
+    # 반응 영상 채널 수에 맞춘 원본 채널 목록
+    def channels(self, n_channels):
+        if self.source.n_channels == 1:
+            # Ref가 모노인데 Mic가 스테레오면 Ref를 복제
+            ref_full = self.source.channel(0)
+            return [ref_full for _ in range(n_channels)]
+        return self.source.channels()
+
+
+# 정렬 결과 (정수 지연 또는 지연 맵)를 보고서에 기록할 수 있는 형태로 변환
+def _lag_summary(lag):
+    if isinstance(lag, tuple):
+        seg_starts, seg_lags = lag
+        return {"seg_starts": [int(s) for s in seg_starts], "seg_lags": [int(v) for v in seg_lags]}
+    return int(lag)
+
+
+# 미리 분석된 원본에 반응 영상 하나를 정렬 및 정제
+# profile: True 또는 StageProfiler이면 단계별 측정 후 (out_path, report) 반환 (기본값은 측정하지 않음)
+# store: AlignmentStore를 주면 같은 입력 쌍의 정렬 결과를 재사용 (alpha / beta만 바꾼 재실행 시 정렬 생략)
+# video_path: 주어지면 정제된 오디오를 이 영상의 영상 스트림과 병합하여 out_path (mkv 등)에 바로 기록
+def align_track(reference, mic_path, out_path, alpha=0.5, beta=0.2, block_size=None, workers=None,
+                executor="thread", multires=False, max_lag_seconds=None, drift=False, drift_window_seconds=10.0,
+                profile=False, store=None, video_path=None):
     if not os.path.exists(mic_path):
         raise FileNotFoundError(f"타겟 파일을 찾을 수 없습니다: {mic_path}")
 
-    fs_ref, data_ref = wav.read(ref_path)
-    fs_mic, data_mic = wav.read(mic_path)
-
-    if fs_ref != fs_mic:
-        raise ValueError(f"샘플링 레이트가 일치하지 않습니다. (Ref: {fs_ref}, Mic: {fs_mic})")
-
-    fs = fs_mic
-
-    # 스테레오를 모노로 변환 (정렬 계산용)
-    if data_ref.ndim > 1:
-        data_ref_mono = np.mean(data_ref, axis=1)
+    if not profile:
+        profiler = NULL_PROFILER
     else:
-        data_ref_mono = data_ref
+        profiler = profile if isinstance(profile, StageProfiler) else StageProfiler()
 
-    if data_mic.ndim > 1:
-        data_mic_mono = np.mean(data_mic, axis=1)
-    else:
-        data_mic_mono = data_mic
+    try:
+        _align_track(reference, mic_path, out_path, alpha, beta, block_size, workers, executor, multires,
+                     max_lag_seconds, drift, drift_window_seconds, store, profiler, video_path)
+    finally:
+        profiler.stop()
 
-    # 정규화 (정렬 계산용 모노 데이터)
-    ref_mono = robust_normalize(data_ref_mono)
-    mic_mono = robust_normalize(data_mic_mono)
+    if profiler is NULL_PROFILER:
+        return out_path
+    return out_path, profiler.report()
 
-    # 실제 처리를 위한 원본 정규화 (채널 유지)
-    ref_full = robust_normalize(data_ref)
-    mic_full = robust_normalize(data_mic)
+
+# 모노 신호 기준 지연 추정 -> (지연값, GCC-PHAT 초기값, 신뢰도 - with_confidence가 아니면 None)
+def _estimate_lag(reference, mic_source, multires, max_lag_seconds, drift, drift_window_seconds, profiler,
+                  with_confidence=False):
+    fs = mic_source.fs
+    ref_mono = reference.mono
+    with profiler.stage("mono"):
+        mic_mono = np.asarray(mic_source.mono())
 
     # 2. 정렬 (Alignment)
     # GCC-PHAT으로 초기값 탐색 (모노 기준)
-    gcc_lag = calculate_gcc_phat(mic_mono, ref_mono)
+    # max_lag_seconds: 반응 영상이 원본 기준 N초 이내에서 시작할 때 탐색 범위 제한
+    max_lag = None if max_lag_seconds is None else int(max_lag_seconds * fs)
+    with profiler.stage("gcc_phat"):
+        if multires:
+            # 다중 해상도 (긴 녹음에서 전체 길이 FFT를 피함)
+            gcc_lag = calculate_gcc_phat_multires(mic_mono, ref_mono, fs, max_lag=max_lag,
+                                                  y_coarse=reference.decimated(4000))
+        else:
+            gcc_lag = calculate_gcc_phat(mic_mono, ref_mono, y_fft=reference.rfft, max_lag=max_lag)
     # 이상치 제거를 통한 정밀 보정 (모노 기준)
-    best_lag = refine_lag_robust(ref_mono, mic_mono, initial_lag=gcc_lag, search_range=200)
+    with profiler.stage("refine_lag"):
+        best_lag = refine_lag_robust(ref_mono, mic_mono, initial_lag=gcc_lag, search_range=200)
+
+    # 구간별 지연 추적 (반응 방송의 일시정지/건너뛰기 대응) - 지연 맵 (구간 시작, 구간별 지연)
+    if drift:
+        with profiler.stage("drift"):
+            best_lag = estimate_lag_map(mic_mono, ref_mono, fs, best_lag, window_seconds=drift_window_seconds,
+                                        ref_coarse=reference.decimated(4000))
+
+    confidence = None
+    if with_confidence:
+        with profiler.stage("confidence"):
+            confidence = lag_confidence(ref_mono, mic_mono, best_lag, fs)
+
+    return best_lag, gcc_lag, confidence
+
+
+def _align_track(reference, mic_path, out_path, alpha, beta, block_size, workers, executor, multires,
+                 max_lag_seconds, drift, drift_window_seconds, store, profiler, video_path):
+    with profiler.stage("load"):
+        mic_source = load_track(mic_path)
+
+    if reference.fs != mic_source.fs:
+        raise ValueError(f"샘플링 레이트가 일치하지 않습니다. (Ref: {reference.fs}, Mic: {mic_source.fs})")
+
+    fs = mic_source.fs
+
+    # 같은 입력 쌍과 정렬 옵션의 결과가 저장되어 있으면 정렬 단계를 건너뜀
+    cached = None
+    if store is not None:
+        with profiler.stage("fingerprint"):
+            params = {
+                "multires": bool(multires),
+                "max_lag_seconds": max_lag_seconds,
+                "drift_window_seconds": drift_window_seconds if drift else None,
+            }
+            ref_hash = reference.fingerprint()
+            mic_hash = file_fingerprint(mic_path)
+            store_key = store.key(ref_hash, mic_hash, params)
+            cached = store.get(store_key)
+
+    if cached is not None:
+        best_lag, confidence = cached
+        gcc_lag = None
+    else:
+        best_lag, gcc_lag, confidence = _estimate_lag(reference, mic_source, multires, max_lag_seconds, drift,
+                                                      drift_window_seconds, profiler, with_confidence=store is not None)
+        if store is not None:
+            store.put(store_key, ref_hash, mic_hash, params, best_lag, confidence)
+
+    profiler.info.update({
+        "fs": int(fs),
+        "n_samples": int(mic_source.n_samples),
+        "n_channels": int(mic_source.n_channels),
+        "gcc_lag": None if gcc_lag is None else int(gcc_lag),
+        "lag": _lag_summary(best_lag),
+        "confidence": confidence,
+        "alignment_cached": cached is not None,
+    })
 
     # 3. 분리 및 후처리 (채널별 처리)
     # 입력이 스테레오인 경우 채널별로 분리하여 처리
-    if mic_full.ndim == 1:
+    # 채널은 지연 뷰로 전달되어 처리 중인 블록만 메모리에 올라감
+    mic_channels = mic_source.channels()
+    if len(mic_channels) == 1:
         # 모노인 경우
-        mic_channels = [mic_full]
-        ref_channels = [ref_full]
+        ref_channels = reference.channels(1)[:1]
     else:
         # 스테레오인 경우 (채널 분리)
-        mic_channels = [mic_full[:, ch] for ch in range(mic_full.shape[1])]
-        # Ref가 모노인데 Mic가 스테레오면 Ref를 복제, 둘 다 스테레오면 분리
-        if ref_full.ndim == 1:
-            ref_channels = [ref_full for _ in range(len(mic_channels))]
+        ref_channels = reference.channels(len(mic_channels))
+
+    if workers is not None and workers > 1:
+        # 병렬 처리 (채널 및 시간 블록 분배) - 위너 필터와 익스팬더가 작업 풀 안에서 함께 측정됨
+        with profiler.stage("parallel_clean"):
+            processed_channels = process_channels_parallel(
+                ref_channels, mic_channels, best_lag, fs, alpha, beta, workers,
+                block_size=block_size or BLOCK_FRAMES * HOP_LENGTH, executor=executor,
+            )
+    elif block_size is not None:
+        # 블록 스트리밍 (입력, 위너 필터, 익스팬더, 저장 모두 블록 단위 - 메모리 사용량이 길이와 무관)
+        return clean_to_wav_stream(out_path, fs, ref_channels, mic_channels, best_lag, alpha, beta, block_size,
+                                   profiler=profiler, video_path=video_path)
+    else:
+        processed_channels = []
+
+        for i in range(len(mic_channels)):
+            # 전체 길이 처리는 채널 전체를 한 번에 변환
+            with profiler.stage("canvas"):
+                mic_ch = np.asarray(mic_channels[i])
+                ref_ch = ref_channels[i]
+
+                # 캔버스 정렬 (채널별)
+                if isinstance(best_lag, tuple):
+                    ref_aligned = align_ref_to_mic_canvas_map(ref_ch, len(mic_ch), best_lag)
+                else:
+                    ref_aligned = align_ref_to_mic_canvas(ref_ch, len(mic_ch), best_lag)
+
+            # 고음질 위너 필터 적용
+            with profiler.stage("wiener"):
+                cleaned_ch = wiener_filter_soft(ref_aligned, mic_ch, alpha=alpha, beta=beta)
+
+                # ISTFT 후 길이 보정
+                if len(cleaned_ch) > len(mic_ch):
+                    cleaned_ch = cleaned_ch[:len(mic_ch)]
+                elif len(cleaned_ch) < len(mic_ch):
+                    cleaned_ch = np.pad(cleaned_ch, (0, len(mic_ch) - len(cleaned_ch)), 'constant')
+
+            # 후처리 (소프트 익스팬더) - 게인 계산과 스무딩을 한 번에 제자리 처리
+            with profiler.stage("expander"):
+                final_ch = apply_soft_expander(cleaned_ch, threshold_db=-45.0, ratio=0.2, release_ms=400, fs=fs,
+                                               out=cleaned_ch)
+
+            processed_channels.append(final_ch)
+
+    with profiler.stage("write"):
+        # 채널 병합
+        if len(processed_channels) > 1:
+            final_audio = np.stack(processed_channels, axis=1)
         else:
-            ref_channels = [ref_full[:, ch] for ch in range(ref_full.shape[1])]
+            final_audio = processed_channels[0]
 
-    processed_channels = []
+        # 5. 저장 (영상과 병합하는 경우 ffmpeg 파이프로 전달)
+        if video_path is None:
+            wav.write(out_path, fs, np.int16(final_audio * 32767))
+        else:
+            with open_output(out_path, fs, len(processed_channels), video_path) as writer:
+                writer.write(processed_channels)
+    return out_path
 
-    for i in range(len(mic_channels)):
-        mic_ch = mic_channels[i]
-        ref_ch = ref_channels[i]
 
-        # 캔버스 정렬 (채널별)
-        ref_aligned = align_ref_to_mic_canvas(ref_ch, len(mic_ch), best_lag)
+def align_audio(ref_path, mic_path, out_path, alpha=0.5, beta=0.2, ref_mono=None, **options):
+    if not os.path.exists(ref_path):
+        raise FileNotFoundError(f"원본 파일을 찾을 수 없습니다: {ref_path}")
+    if not os.path.exists(mic_path):
+        raise FileNotFoundError(f"타겟 파일을 찾을 수 없습니다: {mic_path}")
 
-        # 고음질 위너 필터 적용
-        cleaned_ch = wiener_filter_soft(ref_aligned, mic_ch, alpha=alpha, beta=beta)
+    # 원본 분석도 측정에 포함되도록 프로파일러를 미리 생성
+    profile = options.get("profile", False)
+    if profile and not isinstance(profile, StageProfiler):
+        options["profile"] = profile = StageProfiler()
 
-        # ISTFT 후 길이 보정
-        if len(cleaned_ch) > len(mic_ch):
-            cleaned_ch = cleaned_ch[:len(mic_ch)]
-        elif len(cleaned_ch) < len(mic_ch):
-            cleaned_ch = np.pad(cleaned_ch, (0, len(mic_ch) - len(cleaned_ch)), 'constant')
+    with (profile or NULL_PROFILER).stage("load_reference"):
+        reference = ReferenceTrack(ref_path, mono=ref_mono)
 
-        # 후처리 (소프트 익스팬더) - Numba 적용으로 가속됨
-        final_ch = apply_soft_expander(cleaned_ch, threshold_db=-45.0, ratio=0.2, release_ms=400, fs=fs)
+    return align_track(reference, mic_path, out_path, alpha=alpha, beta=beta, **options)
 
-        processed_channels.append(final_ch)
 
-    # 채널 병합
-    if len(processed_channels) > 1:
-        final_audio = np.stack(processed_channels, axis=1)
-    else:
-        final_audio = processed_channels[0]
+# 원본 하나에 여러 반응 영상을 정렬 (jobs: [(mic_path, out_path), ...], options는 align_track과 동일)
+# profile=True이면 작업마다 별도 보고서가 생성됨 (원본 분석 시간은 포함되지 않음)
+def align_audio_batch(ref_path, jobs, alpha=0.5, beta=0.2, **options):
+    reference = ref_path if isinstance(ref_path, ReferenceTrack) else ReferenceTrack(ref_path)
+
+    return [
+        align_track(reference, mic_path, out_path, alpha=alpha, beta=beta, **options)
+        for mic_path, out_path in jobs
+    ]
+
+
+# endregion
 
-    # 5. 저장
-    wav.write(out_path, fs, np.int16(final_audio * 32767))
+# region 작업 풀에서 실행하는 함수
+
+# 작업 프로세스별 원본 분석 결과 (같은 원본의 반응 영상이 이어서 들어오면 rfft 등을 재사용)
+_worker_references = {}
+
+
+def _worker_reference(ref_path, ref_mono_path):
+    stat = os.stat(ref_path)
+    key = (os.path.abspath(ref_path), stat.st_size, stat.st_mtime_ns)
+    reference = _worker_references.get(key)
+    if reference is None:
+        # 모노 신호는 메모리 맵으로 열어 프로세스끼리 페이지 캐시를 공유 (캐시에서 지워졌으면 다시 변환)
+        mono = None
+        if ref_mono_path is not None and os.path.exists(ref_mono_path):
+            mono = np.load(ref_mono_path, mmap_mode="r")
+        _worker_references.clear()
+        reference = _worker_references[key] = ReferenceTrack(ref_path, mono=mono)
+    return reference
+
+
+# 파일 경로만 받아 정렬 및 정제 (배열을 피클링하지 않음)
+# use_store: 공유 정렬 결과 저장소 사용 / profile=True이면 (out_path, report) 반환
+# block_size를 주지 않으면 블록 스트리밍으로 처리 (긴 방송도 메모리 사용량이 길이와 무관, None을 주면 전체 길이 처리)
+def align_file_task(ref_path, mic_path, out_path, ref_mono_path=None, use_store=False, **options):
+    options.setdefault("block_size", BLOCK_FRAMES * HOP_LENGTH)
+    reference = _worker_reference(ref_path, ref_mono_path)
+    store = get_alignment_store() if use_store else None
+    return align_track(reference, mic_path, out_path, store=store, **options)
+
+
+# 작은 입력으로 Numba 커널을 한 번씩 실행 (컴파일 또는 디스크 캐시 로드를 미리 처리)
+def warm_up_kernels():
+    block = np.zeros(HOP_LENGTH * 4, dtype=np.float32)
+    expander = SoftExpander(fs=48000)
+    expander.process(block)
+    expander.flush()
+
+    ref = np.random.default_rng(0).standard_normal(4000).astype(np.float32)
+    mic = np.concatenate([np.zeros(10, dtype=np.float32), ref])
+    refine_lag_robust(ref, mic, initial_lag=10, search_range=5)
 
 
 # endregion
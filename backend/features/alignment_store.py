@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+
+# region 파일 지문
+# 파일 크기 + 일정 간격으로 뽑은 구간 해시 (수 GB 영상도 전체를 읽지 않음)
+# 미디어 캐시는 조회할 때마다 수정 시각을 갱신하므로 수정 시각은 지문에 넣지 않고 메모 키에만 사용
+# (경로, 크기, 수정 시각, inode가 같으면 프로세스 안에서 다시 계산하지 않음)
+_fingerprints = {}
+_fingerprint_lock = threading.Lock()
+
+
+def file_fingerprint(path: str, chunk_size: int = 1 << 20, n_chunks: int = 8) -> str:
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, stat.st_ino)
+    with _fingerprint_lock:
+        if memo_key in _fingerprints:
+            return _fingerprints[memo_key]
+
+    digest = hashlib.blake2b(str(stat.st_size).encode(), digest_size=20)
+    with open(path, "rb") as f:
+        if stat.st_size <= chunk_size * n_chunks:
+            # 작은 파일은 전체 해시
+            while chunk := f.read(chunk_size):
+                digest.update(chunk)
+        else:
+            # 처음 / 끝 구간을 포함해 n_chunks개 구간을 고르게 읽음
+            step = (stat.st_size - chunk_size) / (n_chunks - 1)
+            for i in range(n_chunks):
+                f.seek(int(i * step))
+                digest.update(f.read(chunk_size))
+    fingerprint = digest.hexdigest()
+
+    with _fingerprint_lock:
+        _fingerprints[memo_key] = fingerprint
+    return fingerprint
+
+
+# endregion
+
+
+# region 정렬 결과 저장소
+# (원본 지문, 반응 지문, 정렬 옵션) -> 지연값 (정수 또는 지연 맵) + 신뢰도
+# alpha / beta 등 정제 옵션만 바꾼 재실행은 저장된 지연값으로 바로 위너 필터 단계부터 진행
+class AlignmentStore:
+    def __init__(self, db_path: str, max_entries: int = 10000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        # 여러 작업 프로세스가 함께 쓰므로 WAL 모드 + 잠금 대기 (busy_timeout)
+        self.db_conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.db_conn.execute("PRAGMA busy_timeout=30000")
+        self.db_conn.execute("PRAGMA journal_mode=WAL")
+        self.db_conn.execute("PRAGMA synchronous=NORMAL")
+        self.db_conn.execute(
+            "CREATE TABLE IF NOT EXISTS alignment ("
+            "key TEXT PRIMARY KEY, ref_hash TEXT, mic_hash TEXT, params TEXT, "
+            "lag INTEGER, seg_starts TEXT, seg_lags TEXT, confidence REAL, created_at REAL, last_used REAL)"
+        )
+        self.db_conn.execute("CREATE INDEX IF NOT EXISTS alignment_last_used ON alignment (last_used)")
+        self.db_conn.commit()
+
+    @staticmethod
+    def key(ref_hash: str, mic_hash: str, params: dict) -> str:
+        raw = json.dumps([ref_hash, mic_hash, params], sort_keys=True)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    # 저장된 결과 -> (지연값, 신뢰도) / 없으면 None
+    def get(self, key: str):
+        with self._lock:
+            row = self.db_conn.execute(
+                "SELECT lag, seg_starts, seg_lags, confidence FROM alignment WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.db_conn.execute("UPDATE alignment SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.db_conn.commit()
+
+        lag, seg_starts, seg_lags, confidence = row
+        if seg_starts is not None:
+            lag = (np.array(json.loads(seg_starts), dtype=np.int64), np.array(json.loads(seg_lags), dtype=np.int64))
+        return lag, confidence
+
+    def put(self, key: str, ref_hash: str, mic_hash: str, params: dict, lag, confidence: float):
+        if isinstance(lag, tuple):
+            values = (None, json.dumps([int(v) for v in lag[0]]), json.dumps([int(v) for v in lag[1]]))
+        else:
+            values = (int(lag), None, None)
+
+        now = time.time()
+        with self._lock:
+            self.db_conn.execute(
+                "INSERT OR REPLACE INTO alignment VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, ref_hash, mic_hash, json.dumps(params, sort_keys=True), *values, float(confidence), now, now),
+            )
+            # 오래 사용하지 않은 결과부터 max_entries개만 남김
+            self.db_conn.execute(
+                "DELETE FROM alignment WHERE key NOT IN "
+                "(SELECT key FROM alignment ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self.db_conn.commit()
+
+    # 결과 삭제 (지문을 주면 그 파일이 포함된 결과만, 아무것도 주지 않으면 전체) -> 삭제된 개수
+    def invalidate(self, ref_hash: str = None, mic_hash: str = None, key: str = None) -> int:
+        conditions, args = [], []
+        for column, value in (("ref_hash", ref_hash), ("mic_hash", mic_hash), ("key", key)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                args.append(value)
+
+        query = "DELETE FROM alignment"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        with self._lock:
+            deleted = self.db_conn.execute(query, args).rowcount
+            self.db_conn.commit()
+        return deleted
+
+    # 파일 경로 기준 삭제 (원본 또는 반응 영상으로 쓰인 결과 모두)
+    def invalidate_file(self, path: str) -> int:
+        fingerprint = file_fingerprint(path)
+        return self.invalidate(ref_hash=fingerprint) + self.invalidate(mic_hash=fingerprint)
+
+    def close(self):
+        self.db_conn.close()
+
+
+_alignment_store = None
+
+
+# 프로세스 전체에서 공유하는 저장소 (ALIGNMENT_DB, ALIGNMENT_MAX_ENTRIES 환경 변수로 설정)
+def get_alignment_store() -> AlignmentStore:
+    global _alignment_store
+    if _alignment_store is None:
+        _alignment_store = AlignmentStore(
+            os.getenv("ALIGNMENT_DB", "./cache/alignment.db"),
+            int(os.getenv("ALIGNMENT_MAX_ENTRIES", "10000")),
+        )
+    return _alignment_store
+
+
+# endregion
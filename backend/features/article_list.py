@@ -0,0 +1,123 @@
+import hashlib
+import json
+import threading
+
+from collections import OrderedDict
+
+from .crawlService import connect_posted_link_db, get_meta, POSTED_LINK_DB
+from .titles import emoji_keys, normalize_viewer
+
+
+# region 검색어 변환
+# 제목 검색어 -> 단어별 앞부분 일치 ("사랑" -> 사랑했지만), 시청자 이모지 -> 모든 이모지를 포함하는 게시물
+def build_match_query(query: str = None, viewer: str = None):
+    terms = []
+    words = [w for w in (query or "").split() if w]
+    if words:
+        terms.append("title : (" + " AND ".join('"' + w.replace('"', '""') + '"*' for w in words) + ")")
+    # 저장된 시청자 토큰은 process_title의 이모지 변환을 거친 값이므로 검색어도 같은 변환 후 비교
+    keys = emoji_keys(normalize_viewer(viewer or "")).split()
+    if keys:
+        terms.append("viewer_keys : (" + " AND ".join(keys) + ")")
+    return " AND ".join(terms) or None
+
+
+# endregion
+
+
+# region 게시물 목록 캐시
+# /api/data 응답 (JSON 바이트 + ETag)을 보관하고, DB의 list_version이 바뀌었을 때만 다시 생성
+# list_version은 크롤링으로 목록 내용 (새 게시물, 제목 변경)이 실제로 바뀐 경우에만 증가
+class ArticleListCache:
+    # 페이지 / 검색 결과 캐시 최대 개수
+    MAX_PAGES = 256
+
+    def __init__(self, db_path: str = POSTED_LINK_DB):
+        self.db_path = db_path
+        self.db_conn = None
+        self.version = None
+        self.etag = None
+        self.body = None
+        self._pages = OrderedDict()  # (before, limit, query, viewer) -> (ETag, JSON 바이트)
+        self._pages_version = None
+        self._lock = threading.Lock()
+
+    # 요청마다 다른 스레드에서 호출되므로 잠금 안에서만 사용
+    def _current_version(self) -> int:
+        if self.db_conn is None:
+            self.db_conn = connect_posted_link_db(self.db_path, check_same_thread=False)
+        return get_meta(self.db_conn, "list_version")
+
+    # 전체 목록 -> (ETag, JSON 바이트)
+    def get(self):
+        with self._lock:
+            version = self._current_version()
+            if version != self.version:
+                self._rebuild(version)
+            return self.etag, self.body
+
+    # 최신순 한 페이지 (before: 이전 페이지의 next_cursor, 이 id보다 오래된 게시물부터)
+    # query: 제목 검색어, viewer: 포함해야 하는 시청자 이모지 -> (ETag, JSON 바이트)
+    # 응답: {"items": [{"id", "title", "viewer"}, ...], "next_cursor": 다음 페이지 before 값 또는 null}
+    def page(self, before: int = None, limit: int = 50, query: str = None, viewer: str = None):
+        key = (before, limit, (query or "").strip(), (viewer or "").strip())
+        with self._lock:
+            version = self._current_version()
+            if version != self._pages_version:
+                self._pages.clear()
+                self._pages_version = version
+
+            cached = self._pages.get(key)
+            if cached is None:
+                cached = self._pages[key] = self._query_page(*key)
+                if len(self._pages) > self.MAX_PAGES:
+                    self._pages.popitem(last=False)
+            else:
+                self._pages.move_to_end(key)
+            return cached
+
+    def _query_page(self, before, limit, query, viewer):
+        conditions, args = ["listed = 1"], []
+        if before is not None:
+            conditions.append("article_id < ?")
+            args.append(before)
+        match = build_match_query(query, viewer)
+        if match is not None:
+            conditions.append("article_id IN (SELECT rowid FROM title_search WHERE title_search MATCH ?)")
+            args.append(match)
+
+        # 다음 페이지가 있는지 확인하기 위해 하나 더 읽음 (article_id 기본 키 순서대로 읽다가 멈춤)
+        rows = self.db_conn.execute(
+            "SELECT article_id, title, viewer FROM parsed_title WHERE " + " AND ".join(conditions) +
+            " ORDER BY article_id DESC LIMIT ?",
+            (*args, limit + 1),
+        ).fetchall()
+
+        items = [{"id": article_id, "title": title, "viewer": viewer} for article_id, title, viewer in rows[:limit]]
+        next_cursor = items[-1]["id"] if len(rows) > limit else None
+        body = json.dumps({"items": items, "next_cursor": next_cursor}, ensure_ascii=False).encode("utf-8")
+        return f"{self._pages_version}-{hashlib.sha1(body).hexdigest()[:16]}", body
+
+    def _rebuild(self, version: int):
+        rows = self.db_conn.execute(
+            "SELECT article_id, title, viewer FROM parsed_title WHERE listed = 1 ORDER BY article_id DESC"
+        ).fetchall()
+        self.body = json.dumps(
+            {str(article_id): [title, viewer] for article_id, title, viewer in rows}, ensure_ascii=False
+        ).encode("utf-8")
+        self.etag = hashlib.sha1(self.body).hexdigest()[:20]
+        self.version = version
+
+
+_article_list_cache = None
+
+
+# 프로세스 전체에서 공유하는 목록 캐시
+def get_article_list_cache() -> ArticleListCache:
+    global _article_list_cache
+    if _article_list_cache is None:
+        _article_list_cache = ArticleListCache()
+    return _article_list_cache
+
+
+# endregion
@@ -2,7 +2,13 @@
 import numpy as np
 import scipy.io.wavfile as wav
 from scipy import signal
+from scipy import fft as sp_fft
 import os
+import subprocess
+import tempfile
+import wave
+from multiprocessing import shared_memory
+from numba import jit, prange
 
 # endregion
 
@@ -15,16 +21,20 @@ def next_pow2(n):
     return 1 << (int(n - 1).bit_length())
 
 
-# 오디오 정규화 함수
-def robust_normalize(data):
+# 정수 PCM을 float32로 변환
+def _pcm_to_float32(data):
     if data.dtype == np.int16:
-        data = data.astype(np.float32) / 32768.0
+        return data.astype(np.float32) / 32768.0
     elif data.dtype == np.int32:
-        data = data.astype(np.float32) / 2147483648.0
+        return data.astype(np.float32) / 2147483648.0
     elif data.dtype == np.uint8:
-        data = (data.astype(np.float32) - 128.0) / 128.0
+        return (data.astype(np.float32) - 128.0) / 128.0
+    return data.astype(np.float32)
+
 
-    data = data.astype(np.float32)
+# 오디오 정규화 함수
+def robust_normalize(data):
+    data = _pcm_to_float32(data)
 
     # 오디오의 최대 절대값을 1로 정규화
     max_val = np.max(np.abs(data))
@@ -32,20 +42,295 @@ def robust_normalize(data):
     return data
 
 
+# endregion
+
+# region WAV 입출력 (메모리 맵 / 스트리밍 기록)
+
+# 정규화된 float32 채널을 필요한 구간만 읽어오는 지연 뷰 (channel=None이면 모노 믹스)
+class NormalizedChannel:
+    def __init__(self, reader, channel):
+        self.reader = reader
+        self.channel = channel
+
+    def __len__(self):
+        return self.reader.n_samples
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError("NormalizedChannel은 슬라이스로만 읽을 수 있습니다.")
+        start, stop, step = index.indices(len(self))
+        return self.reader.read(start, max(start, stop), self.channel)[::step]
+
+    # NumPy 함수에 넘기면 전체 채널을 한 번만 변환하여 반환
+    def __array__(self, dtype=None, copy=None):
+        data = self.reader.read(0, len(self), self.channel)
+        return data if dtype is None else data.astype(dtype)
+
+
+# WAV 파일을 메모리 맵으로 열고, 정규화 최대값은 블록 단위로 한 번만 계산
+class WavReader:
+    def __init__(self, path, chunk_size=1 << 20):
+        try:
+            self.fs, self.data = wav.read(path, mmap=True)
+        except ValueError:
+            # 메모리 맵을 지원하지 않는 포맷 (24비트 등)
+            self.fs, self.data = wav.read(path)
+
+        self.path = path
+        self.chunk_size = chunk_size
+        self.n_samples = self.data.shape[0]
+        self.n_channels = 1 if self.data.ndim == 1 else self.data.shape[1]
+        self.peak, self.mono_peak = self._scan_peaks()
+
+    # 원본 채널 / 모노 믹스의 최대 절대값 (robust_normalize와 같은 기준)
+    def _scan_peaks(self):
+        peak = 0.0
+        mono_peak = 0.0
+        for start in range(0, self.n_samples, self.chunk_size):
+            raw = self.data[start:start + self.chunk_size]
+            peak = max(peak, float(np.max(np.abs(_pcm_to_float32(raw)), initial=0.0)))
+            if raw.ndim > 1:
+                mono = np.mean(raw, axis=1).astype(np.float32)
+                mono_peak = max(mono_peak, float(np.max(np.abs(mono), initial=0.0)))
+        if self.data.ndim == 1:
+            mono_peak = peak
+        return np.float32(peak), np.float32(mono_peak)
+
+    # [start, stop) 구간을 정규화된 float32로 읽기 (channel=None이면 모노 믹스)
+    def read(self, start, stop, channel=None):
+        raw = self.data[start:stop]
+
+        if channel is None:
+            if raw.ndim > 1:
+                # 모노 믹스는 robust_normalize(np.mean(data, axis=1))과 같은 값
+                block = np.mean(raw, axis=1).astype(np.float32)
+            else:
+                block = _pcm_to_float32(raw)
+            peak = self.mono_peak
+        else:
+            block = _pcm_to_float32(raw if raw.ndim == 1 else raw[:, channel])
+            peak = self.peak
+
+        if peak > 1e-5:
+            block /= peak
+        return block
+
+    def mono(self):
+        return NormalizedChannel(self, None)
+
+    def channel(self, channel):
+        return NormalizedChannel(self, channel)
+
+    def channels(self):
+        return [self.channel(ch) for ch in range(self.n_channels)]
+
+
+# 채널별 float32 블록을 받아 16비트 WAV로 이어서 기록 (wav.write(np.int16(x * 32767))과 같은 변환)
+class WavWriter:
+    def __init__(self, path, fs, n_channels):
+        self.file = wave.open(path, "wb")
+        self.file.setnchannels(n_channels)
+        self.file.setsampwidth(2)
+        self.file.setframerate(fs)
+
+    def write(self, channels):
+        frames = np.stack(channels, axis=1) if len(channels) > 1 else channels[0]
+        self.file.writeframes((frames * 32767).astype("<i2").tobytes())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# endregion
+
+# region ffmpeg 파이프 입출력 (중간 WAV 파일 없이 영상 파일에서 바로 읽고, 정제 결과를 바로 병합)
+
+# 영상 / 오디오 파일의 첫 오디오 스트림을 16비트 PCM으로 디코딩하여 블록 단위로 write에 전달
+# 이전에 ffmpeg로 만들던 WAV (pcm_s16le)와 같은 샘플이 나오므로 정렬 결과와 캐시가 그대로 유지됨
+def _ffmpeg_decode_to(path, write, fs, n_channels, chunk_size):
+    command = [
+        "ffmpeg", "-nostdin", "-loglevel", "error",
+        "-i", path,
+        "-map", "0:a:0", "-vn",
+        "-ac", str(n_channels), "-ar", str(fs),
+        "-f", "s16le", "pipe:1",
+    ]
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            while chunk := process.stdout.read(chunk_size * 2 * n_channels):
+                write(chunk)
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+
+        if returncode != 0:
+            stderr.seek(0)
+            raise RuntimeError(f"ffmpeg 디코딩 실패 ({path}): {stderr.read().decode(errors='replace').strip()}")
+
+
+# 디코딩 결과를 임시 파일의 메모리 맵으로 반환 (WAV와 마찬가지로 읽는 구간만 메모리에 올라감, 파일은 맵이 해제되면 사라짐)
+# temp_dir: 임시 파일 위치 (기본값은 원본 파일 폴더 - /tmp가 메모리 파일 시스템인 경우를 피함)
+def ffmpeg_decode(path, fs=44100, n_channels=2, chunk_size=1 << 20, temp_dir=None):
+    temp_dir = temp_dir or os.path.dirname(os.path.abspath(path))
+    with tempfile.TemporaryFile(dir=temp_dir) as pcm:
+        _ffmpeg_decode_to(path, pcm.write, fs, n_channels, chunk_size)
+
+        n = pcm.tell() // (2 * n_channels)
+        shape = (n, n_channels) if n_channels > 1 else (n,)
+        if n == 0:
+            return np.zeros(shape, dtype="<i2")
+        # 메모리 맵은 파일 디스크립터를 따로 유지하므로 임시 파일을 닫아도 유효함
+        return np.memmap(pcm, dtype="<i2", mode="r", shape=shape)
+
+
+# 디코딩 결과를 16비트 WAV 파일로 저장 (여러 프로세스가 같은 원본을 메모리 맵으로 읽을 때 한 번만 디코딩)
+def ffmpeg_decode_to_wav(path, out_path, fs=44100, n_channels=2, chunk_size=1 << 20):
+    with wave.open(out_path, "wb") as f:
+        f.setnchannels(n_channels)
+        f.setsampwidth(2)
+        f.setframerate(fs)
+        _ffmpeg_decode_to(path, f.writeframesraw, fs, n_channels, chunk_size)
+    return out_path
+
+
+# ffmpeg로 디코딩한 오디오를 WavReader와 같은 방식으로 읽기 (정규화, 모노 믹스, 지연 뷰 동일)
+class FfmpegReader(WavReader):
+    def __init__(self, path, fs=44100, n_channels=2, chunk_size=1 << 20):
+        self.fs = fs
+        self.data = ffmpeg_decode(path, fs, n_channels)
+        self.path = path
+        self.chunk_size = chunk_size
+        self.n_samples = self.data.shape[0]
+        self.n_channels = n_channels
+        self.peak, self.mono_peak = self._scan_peaks()
+
+
+# WAV는 메모리 맵으로, 그 외 (mp4, webm 등)는 ffmpeg 파이프로 열기
+def open_audio(path):
+    if os.path.splitext(path)[1].lower() == ".wav":
+        return WavReader(path)
+    return FfmpegReader(path)
+
+
+# open_audio로 열었을 때의 샘플링 레이트 (파일 전체를 읽지 않음, ffmpeg로 여는 파일은 디코딩 설정값)
+def audio_sample_rate(path, decode_fs=44100):
+    if os.path.splitext(path)[1].lower() != ".wav":
+        return decode_fs
+    try:
+        with wave.open(path, "rb") as f:
+            return f.getframerate()
+    except (wave.Error, EOFError):
+        # wave 모듈이 읽지 못하는 형식 (float, 확장 헤더 등)
+        return WavReader(path).fs
+
+
+# 채널별 float32 블록을 ffmpeg stdin으로 보내 영상 파일의 영상 스트림과 바로 병합 (WavWriter와 같은 사용법)
+# 영상은 재인코딩하지 않고 복사, 오디오 코덱은 출력 컨테이너 기본값
+class FfmpegMuxWriter:
+    def __init__(self, video_path, out_path, fs, n_channels):
+        self.out_path = out_path
+        self.stderr = tempfile.TemporaryFile()
+        command = [
+            "ffmpeg", "-y", "-nostdin", "-loglevel", "error",
+            "-i", video_path,
+            "-f", "s16le", "-ar", str(fs), "-ac", str(n_channels), "-i", "pipe:0",
+            "-map", "0:v:0",  # 첫 번째 입력의 비디오 스트림 선택
+            "-map", "1:a:0",  # 파이프로 받은 오디오 선택
+            "-c:v", "copy",
+            out_path,
+        ]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                        stderr=self.stderr)
+
+    def write(self, channels):
+        frames = np.stack(channels, axis=1) if len(channels) > 1 else channels[0]
+        try:
+            self.process.stdin.write((frames * 32767).astype("<i2").tobytes())
+        except BrokenPipeError:
+            # ffmpeg가 먼저 종료된 경우 (오류 내용은 close에서 확인)
+            pass
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = self.process.wait()
+        self.stderr.seek(0)
+        err_msg = self.stderr.read().decode(errors="replace").strip()
+        self.stderr.close()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg 병합 실패 ({self.out_path}): {err_msg}")
+
+    # 처리 도중 예외가 나면 ffmpeg를 중단하고 만들다 만 파일 삭제
+    def abort(self):
+        self.process.kill()
+        self.process.wait()
+        self.stderr.close()
+        if os.path.exists(self.out_path):
+            os.remove(self.out_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+# endregion
+
+# region 공유 메모리 배열
+
+# 프로세스 간에 피클링 없이 공유할 배열 생성 (spec = (이름, shape, dtype))
+def create_shared_array(shape, dtype=np.float32):
+    nbytes = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    shm = shared_memory.SharedMemory(create=True, size=nbytes)
+    array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    return shm, array, (shm.name, tuple(shape), np.dtype(dtype).str)
+
+
+# 다른 프로세스에서 만든 공유 배열에 연결
+def attach_shared_array(spec):
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+# 공유 배열 해제 (생성한 쪽에서만 unlink)
+def release_shared_array(shm, unlink=False):
+    shm.close()
+    if unlink:
+        shm.unlink()
+
+
 # endregion
 
 # region 정렬 관련 함수들
 
 # region gcc-phat 함수
 
-def calculate_gcc_phat(x, y):
+def calculate_gcc_phat(x, y, y_fft=None, max_lag=None):
     # FFT 크기 계산
-    n = len(x) + len(y) - 1
+    if max_lag is None:
+        n = len(x) + len(y) - 1
+    else:
+        # |지연| <= max_lag 범위만 볼 때는 순환 상관이 겹치지 않을 만큼만 패딩
+        n = max(len(x), len(y)) + max_lag
     n_fft = next_pow2(n)
 
-    # FFT 수행
+    # FFT 수행 (y_fft: FFT 크기를 받아 미리 계산된 y의 rfft를 돌려주는 함수)
     X = np.fft.rfft(x, n=n_fft)
-    Y = np.fft.rfft(y, n=n_fft)
+    Y = np.fft.rfft(y, n=n_fft) if y_fft is None else y_fft(n_fft)
 
     # PHAT 가중치를 적용한 상호 전력 스펙트럼
     G = X * np.conj(Y)
@@ -55,7 +340,7 @@ def calculate_gcc_phat(x, y):
     cc = np.fft.irfft(R, n=n_fft)
 
     # 지연이 0인 지점을 중심으로 재정렬
-    half = n_fft // 2
+    half = n_fft // 2 if max_lag is None else min(max_lag, n_fft // 2)
     cc_lin = np.concatenate((cc[-half:], cc[:half + 1]))
     k = int(np.argmax(cc_lin))
 
@@ -71,42 +356,201 @@ def calculate_gcc_phat(x, y):
     return int(round(lag_samples))
 
 
+# 다중 해상도 GCC-PHAT (저해상도로 대략적인 지연을 찾은 뒤 원래 해상도에서 주변만 보정)
+def calculate_gcc_phat_multires(x, y, fs, coarse_fs=4000, max_lag=None, fine_seconds=30.0, fine_radius=None,
+                                y_coarse=None):
+    # 1. 데시메이션 (안티 앨리어싱 포함)
+    q = max(1, int(fs // coarse_fs))
+    x_c = signal.resample_poly(x, 1, q).astype(np.float32)
+    y_c = signal.resample_poly(y, 1, q).astype(np.float32) if y_coarse is None else y_coarse
+
+    # 2. 저해상도 지연 탐색 (max_lag 제한)
+    coarse_max = None if max_lag is None else -(-max_lag // q) + 1
+    coarse_lag = calculate_gcc_phat(x_c, y_c, max_lag=coarse_max) * q
+
+    # 3. 원래 해상도에서 겹치는 구간 일부만으로 주변 보정
+    if fine_radius is None:
+        fine_radius = 4 * q
+    return refine_gcc_phat_local(x, y, coarse_lag, fine_radius, int(fine_seconds * fs))
+
+
+# 주어진 지연 주변 ±radius 범위만 원래 해상도 GCC-PHAT으로 보정 (원본 구간 [r0, r0 + seg_len) 사용)
+def refine_gcc_phat_local(x, y, lag, radius, seg_len, r0=None):
+    seg_len = min(len(y), seg_len)
+
+    # 기본값: 겹치는 구간의 중앙에서 원본 구간 선택
+    if r0 is None:
+        overlap_start = max(0, -lag)
+        overlap_end = min(len(y), len(x) - lag)
+        r0 = max(0, (overlap_start + overlap_end - seg_len) // 2)
+
+    # 반응 구간은 ±radius 여유를 두고, 원본 구간 앞에 같은 길이를 붙여 중심을 맞춤
+    x_seg = array_block_reader(x)(r0 + lag - radius, r0 + lag + seg_len + radius)
+    y_seg = array_block_reader(y, offset=radius)(r0, r0 + seg_len + radius)
+
+    return lag + calculate_gcc_phat(x_seg, y_seg, max_lag=radius)
+
+
+# 여러 구간 쌍의 GCC-PHAT을 행 단위로 한 번에 계산 (|지연| <= max_lag, 반환: 지연, 피크 값)
+def _gcc_phat_rows(x_rows, y_rows, max_lag, workers=-1):
+    n_fft = next_pow2(max(x_rows.shape[1], y_rows.shape[1]) + max_lag)
+
+    X = sp_fft.rfft(x_rows, n=n_fft, axis=1, workers=workers)
+    Y = sp_fft.rfft(y_rows, n=n_fft, axis=1, workers=workers)
+
+    G = X * np.conj(Y)
+    G /= np.abs(G) + 1e-12
+    cc = sp_fft.irfft(G, n=n_fft, axis=1, workers=workers)
+
+    cc_lin = np.concatenate((cc[:, -max_lag:], cc[:, :max_lag + 1]), axis=1)
+    k = np.argmax(cc_lin, axis=1)
+    return k - max_lag, cc_lin[np.arange(len(k)), k]
+
+
+# endregion
+
+# region 구간별 지연 추적 (드리프트)
+
+# 구간별 지연 맵 추정 (반환: (구간 시작 위치 배열, 구간별 지연 배열) - 반응 영상 기준 샘플 단위)
+def estimate_lag_map(mic, ref, fs, global_lag, window_seconds=10.0, search_seconds=10.0, coarse_fs=4000,
+                     min_confidence=0.5, smooth_windows=5, batch_size=32, ref_coarse=None, workers=-1):
+    # 1. 데시메이션
+    q = max(1, int(fs // coarse_fs))
+    mic_c = signal.resample_poly(mic, 1, q).astype(np.float32)
+    ref_c = signal.resample_poly(ref, 1, q).astype(np.float32) if ref_coarse is None else ref_coarse
+
+    win = max(1, int(window_seconds * fs) // q)
+    radius = max(1, int(search_seconds * fs) // q)
+    lag_c = int(round(global_lag / q))
+    n_win = -(-len(mic_c) // win)
+
+    # 2. 모든 구간의 지연을 배치 단위 행렬 FFT로 계산
+    # 반응 구간은 ±radius 여유, 원본 구간은 전역 지연만큼 옮긴 뒤 radius 만큼 앞에서 시작
+    mic_read = array_block_reader(mic_c)
+    ref_read = array_block_reader(ref_c, offset=lag_c + radius)
+    deltas = np.zeros(n_win, dtype=np.int64)
+    peaks = np.zeros(n_win, dtype=np.float64)
+
+    for b in range(0, n_win, batch_size):
+        idx = np.arange(b, min(n_win, b + batch_size))
+        x_rows = np.stack([mic_read(i * win - radius, (i + 1) * win + radius) for i in idx])
+        y_rows = np.stack([ref_read(i * win, (i + 1) * win + radius) for i in idx])
+        deltas[idx], peaks[idx] = _gcc_phat_rows(x_rows, y_rows, radius, workers=workers)
+
+    # 3. 신뢰도가 낮은 구간 (무음, 목소리만 있는 구간, 원본이 끝난 구간 등)은 이웃 값으로 채움
+    valid = peaks >= min_confidence * np.median(peaks[peaks > 0]) if np.any(peaks > 0) else np.zeros(n_win, bool)
+    if not np.any(valid):
+        return np.array([0], dtype=np.int64), np.array([global_lag], dtype=np.int64)
+
+    valid_idx = np.flatnonzero(valid)
+    nearest = valid_idx[np.clip(np.searchsorted(valid_idx, np.arange(n_win)), 0, len(valid_idx) - 1)]
+    deltas = deltas[nearest]
+
+    # 4. 중앙값 필터로 튀는 값 제거
+    if smooth_windows > 1 and n_win >= smooth_windows:
+        deltas = signal.medfilt(deltas.astype(np.float64), smooth_windows | 1).astype(np.int64)
+
+    # 5. 같은 지연이 이어지는 구간을 하나로 묶고, 변화가 있는 구간만 원래 해상도에서 보정
+    change = np.flatnonzero(np.diff(deltas)) + 1
+    run_starts = np.concatenate(([0], change))
+    run_ends = np.concatenate((change, [n_win]))
+
+    seg_starts = run_starts * win * q
+    seg_lags = np.empty(len(run_starts), dtype=np.int64)
+    for j, (rs, re_) in enumerate(zip(run_starts, run_ends)):
+        if deltas[rs] == 0:
+            seg_lags[j] = global_lag
+            continue
+
+        coarse_lag = global_lag + int(deltas[rs]) * q
+        seg_len = min(int(window_seconds * fs), (re_ - rs) * win * q)
+        r0 = max(0, seg_starts[j] - coarse_lag)
+        seg_lags[j] = refine_gcc_phat_local(mic, ref, coarse_lag, 4 * q, seg_len, r0=r0)
+
+    return seg_starts, seg_lags
+
+
 # endregion
 
 # region 정밀 지연 보정 함수
 
+# 모든 지연값에 대한 하위 k개 오차 합의 하한 계산
+# 임의의 t에 대해 sum(min(d, t)) - (N - k) * t <= 하위 k개 합 이므로 정렬 없이 하한을 얻음
+@jit(nopython=True, cache=True, parallel=True, fastmath=True)
+def _trimmed_lower_bound_jit(mic_padded, ref_comp, starts, threshold, n_drop):
+    n = len(ref_comp)
+    lower_bound = np.empty(len(starts), dtype=np.float64)
+    t32 = np.float32(threshold)
+
+    for j in prange(len(starts)):
+        s = starts[j]
+        acc = 0.0
+
+        # float32 SIMD 누적은 4096개 단위로 끊어 float64에 합산 (반올림 오차 제한)
+        for b in range(0, n, 4096):
+            e = min(n, b + 4096)
+            acc32 = np.float32(0.0)
+            for i in range(b, e):
+                acc32 += min(abs(mic_padded[s + i] - ref_comp[i]), t32)
+            acc += acc32
+
+        lower_bound[j] = acc - n_drop * threshold
+
+    return lower_bound
+
+
 def refine_lag_robust(ref, mic, initial_lag, search_range=200, keep_ratio=0.7):
     n_ref = len(ref)
     center = initial_lag
-    lags = range(center - search_range, center + search_range + 1)
+    lags = np.arange(center - search_range, center + search_range + 1)
 
-    # 효율적인 뷰 생성을 위한 선행 패딩
+    # 범위 밖을 0으로 보는 선행 패딩 크기
     pad_size = abs(center) + search_range + 1000
-    mic_padded = np.pad(mic, (pad_size, pad_size), 'constant')
 
     # 속도 최적화를 위해 앞부분 30초만 비교
     compare_len = min(n_ref, 16000 * 30)
-    ref_comp = ref[:compare_len]
+    ref_comp = np.asarray(ref[:compare_len], dtype=np.float32)
     k = int(compare_len * keep_ratio)  # 하위 70% 인덱스
 
-    best_lag = center
-    min_error = float('inf')
+    # 비교 구간이 끝까지 들어가는 지연값만 사용
+    valid = lags + compare_len <= len(mic) + pad_size
+    lags = lags[valid]
+    if len(lags) == 0:
+        return center
 
-    for lag in lags:
-        start = pad_size + lag
-        end = start + compare_len
-        mic_view = mic_padded[start:end]
-
-        if len(mic_view) < compare_len: continue
+    # 후보 지연값이 참조하는 반응 영상 구간만 읽음 (범위 밖은 0)
+    mic_padded = array_block_reader(mic)(int(lags[0]), int(lags[-1]) + compare_len)
+    starts = lags - lags[0]
 
+    # 하위 70% 오차 합 (목소리 제외)
+    def trimmed_error(start):
         # L1 오차 계산
-        diff = np.abs(mic_view - ref_comp)
-
-        # 하위 70% 오차만 합산 (목소리 제외)
+        diff = np.abs(mic_padded[start:start + compare_len] - ref_comp)
         partitioned = np.partition(diff, k)
-        err = np.sum(partitioned[:k])
+        return np.sum(partitioned[:k]), partitioned[k]
 
-        if err < min_error:
+    # 1. 초기 지연값에서 임계값 t (k번째 오차) 계산
+    c = int(np.argmin(np.abs(lags - center)))
+    _, t = trimmed_error(starts[c])
+    t = float(t)
+
+    # 2. 모든 지연값의 하한 계산 (Numba 병렬)
+    lower_bound = _trimmed_lower_bound_jit(mic_padded, ref_comp, starts, t, compare_len - k)
+
+    # 3. 하한이 낮은 순서로 정확한 오차 계산, 하한이 현재 최소 오차를 넘으면 중단
+    best_lag = center
+    min_error = float('inf')
+
+    for i in np.argsort(lower_bound, kind='stable'):
+        # float32 합산 오차를 고려한 여유
+        if lower_bound[i] > min_error * (1 + 1e-3) + 1e-6:
+            break
+
+        err, _ = trimmed_error(starts[i])
+        lag = int(lags[i])
+
+        # 기존 순차 탐색과 같이 오차가 같으면 작은 지연값 우선
+        if err < min_error or (err == min_error and lag < best_lag):
             min_error = err
             best_lag = lag
 
@@ -137,6 +581,78 @@ def align_ref_to_mic_canvas(ref, mic_len, lag):
     return ref_aligned
 
 
+# 배열에서 [start, stop) 구간을 읽는 함수 생성 (0 ~ length 범위 밖은 0으로 채움)
+def array_block_reader(data, offset=0, length=None):
+    n = len(data)
+    if length is None:
+        length = n + offset
+
+    def read(start, stop):
+        block = np.zeros(stop - start, dtype=np.float32)
+        s = max(start, offset, 0)
+        e = min(stop, offset + n, length)
+        if e > s:
+            block[s - start: e - start] = data[s - offset: e - offset]
+        return block
+
+    return read
+
+
+# 구간별 지연 맵에 따라 원본을 반응 영상 위치에 배치한 결과를 블록 단위로 읽는 함수 생성
+def lag_map_block_reader(ref, mic_len, lag_map):
+    seg_starts, seg_lags = lag_map
+    seg_ends = np.append(seg_starts[1:], mic_len)
+    readers = [array_block_reader(ref, offset=int(lag), length=mic_len) for lag in seg_lags]
+
+    def read(start, stop):
+        block = np.zeros(stop - start, dtype=np.float32)
+        first = max(0, int(np.searchsorted(seg_starts, start, side='right')) - 1)
+        for j in range(first, len(seg_starts)):
+            s = max(start, seg_starts[j])
+            e = min(stop, seg_ends[j])
+            if s >= stop:
+                break
+            if e > s:
+                block[s - start: e - start] = readers[j](s, e)
+        return block
+
+    return read
+
+
+# align_ref_to_mic_canvas와 같은 정렬 결과를 블록 단위로 읽는 함수 생성 (lag: 정수 또는 지연 맵)
+def aligned_block_reader(ref, mic_len, lag):
+    if isinstance(lag, tuple):
+        return lag_map_block_reader(ref, mic_len, lag)
+    return array_block_reader(ref, offset=lag, length=mic_len)
+
+
+# 지연 맵을 구간별로 적용한 캔버스 정렬
+def align_ref_to_mic_canvas_map(ref, mic_len, lag_map):
+    return lag_map_block_reader(ref, mic_len, lag_map)(0, mic_len)
+
+
+# 정렬 신뢰도 (0 ~ 1) - 고르게 뽑은 구간에서 정렬된 원본과 반응 신호의 상관계수 중앙값
+# 원본이 절반 이상 겹치지 않는 구간은 제외 (lag: 정수 또는 지연 맵)
+def lag_confidence(ref, mic, lag, fs, n_windows=8, window_seconds=5.0):
+    n = len(mic)
+    win = min(n, int(window_seconds * fs))
+    ref_read = aligned_block_reader(ref, n, lag)
+
+    scores = []
+    for start in np.linspace(0, n - win, n_windows).astype(np.int64):
+        r = ref_read(start, start + win).astype(np.float64)
+        if np.count_nonzero(r) < win // 2:
+            continue
+        m = np.asarray(mic[start:start + win], dtype=np.float64)
+        r -= r.mean()
+        m -= m.mean()
+        denom = np.sqrt(np.dot(r, r) * np.dot(m, m))
+        if denom > 1e-12:
+            scores.append(abs(np.dot(r, m)) / denom)
+
+    return float(np.median(scores)) if scores else 0.0
+
+
 # endregion
 
 # endregion
@@ -0,0 +1,97 @@
+import asyncio
+import atexit
+import multiprocessing
+import os
+import threading
+
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+
+# region 작업 프로세스 준비
+# 프로세스가 뜰 때 Numba 커널을 미리 불러와 첫 작업에서 컴파일 / 캐시 로드 시간이 들지 않도록 함
+def _warm_up():
+    try:
+        from .align_audio import warm_up_kernels
+    except ImportError:
+        # 스크립트로 직접 실행하는 경우
+        from align_audio import warm_up_kernels
+    warm_up_kernels()
+
+
+def _ready():
+    return os.getpid()
+
+
+# endregion
+
+
+# region 계산 작업 풀
+# CPU를 많이 쓰는 오디오 처리를 별도 프로세스에서 실행 (GIL 때문에 스레드로는 여러 작업이 직렬화됨)
+# - Numba 병렬 스레드 풀은 fork 이후 안전하지 않으므로 spawn 사용
+# - 오디오는 파일 경로 (메모리 맵) 또는 공유 메모리로 넘기고 배열을 직접 피클링하지 않음
+# - 작업 프로세스가 비정상 종료되면 (메모리 부족 등) 실행기를 새로 만들고 작업을 한 번 다시 시도
+class ComputePool:
+    def __init__(self, workers: int, initializer=_warm_up):
+        self.workers = max(1, workers)
+        self.initializer = initializer
+        self._lock = threading.Lock()
+        self.executor = self._create_executor()
+
+    def _create_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=self.initializer,
+        )
+
+    # 고장난 실행기를 새 실행기로 교체 (여러 작업이 동시에 실패해도 한 번만 교체)
+    def restart(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            if self.executor is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self.executor = self._create_executor()
+        return self.executor
+
+    # 모든 작업 프로세스를 미리 띄우고 준비가 끝날 때까지 대기 (timeout 초, None이면 무제한)
+    def warm(self, timeout: float = None):
+        futures = [self.executor.submit(_ready) for _ in range(self.workers)]
+        wait(futures, timeout=timeout)
+
+    def submit(self, func, *args, **kwargs):
+        executor = self.executor
+        try:
+            return executor.submit(func, *args, **kwargs)
+        except BrokenProcessPool:
+            return self.restart(executor).submit(func, *args, **kwargs)
+
+    # 이벤트 루프에서 결과를 기다림 (실행 중 작업 프로세스가 죽으면 새 실행기에서 한 번 다시 실행)
+    async def run(self, func, *args, **kwargs):
+        executor = self.executor
+        try:
+            return await asyncio.wrap_future(executor.submit(func, *args, **kwargs))
+        except BrokenProcessPool:
+            executor = self.restart(executor)
+            return await asyncio.wrap_future(executor.submit(func, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_compute_pool = None
+_compute_pool_lock = threading.Lock()
+
+
+# 프로세스 전체에서 공유하는 작업 풀 (COMPUTE_WORKERS 환경 변수로 설정, 기본값은 CPU 수)
+# 처음 호출될 때 작업 프로세스를 띄우고 Numba 커널 준비를 시작함 (준비 완료는 기다리지 않음)
+def get_compute_pool() -> ComputePool:
+    global _compute_pool
+    with _compute_pool_lock:
+        if _compute_pool is None:
+            _compute_pool = ComputePool(int(os.getenv("COMPUTE_WORKERS", str(os.cpu_count() or 1))))
+            _compute_pool.warm(timeout=0)
+            atexit.register(_compute_pool.shutdown, False)
+    return _compute_pool
+
+
+# endregion
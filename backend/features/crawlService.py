@@ -1,90 +1,265 @@
+import asyncio
 import os
 import sqlite3
+import time
 
 from uuid import uuid4
-from httpx import AsyncClient, AsyncHTTPTransport
 from dotenv import load_dotenv
 
+try:
+    from .http_client import http_get
+    from .titles import parse_title, TITLE_PARSER_VERSION
+except ImportError:
+    # 스크립트로 직접 불러오는 경우 (benchmarks)
+    from http_client import http_get
+    from titles import parse_title, TITLE_PARSER_VERSION
+
+# region 게시물 DB
+POSTED_LINK_DB = "./database/posted_link.db"
+
+# posted_link 스키마
+# - article_id: 네이버 카페 게시물 id (INTEGER PRIMARY KEY이므로 rowid 인덱스로 바로 조회, 숫자 순 정렬)
+# - first_seen_at / last_seen_at: 처음 / 마지막으로 크롤링된 시각, updated_at: 제목이 마지막으로 바뀐 시각
+POSTED_LINK_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS posted_link ("
+    "article_id INTEGER PRIMARY KEY, title TEXT NOT NULL, "
+    "first_seen_at REAL NOT NULL, last_seen_at REAL NOT NULL, updated_at REAL NOT NULL)"
+)
+
+# 목록 화면용 해석 결과 (process_title + 표시 여부 + 이모지 검색 토큰, 게시물 제목이 바뀔 때만 다시 계산)
+PARSED_TITLE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS parsed_title ("
+    "article_id INTEGER PRIMARY KEY, source_title TEXT NOT NULL, "
+    "title TEXT NOT NULL, viewer TEXT NOT NULL, listed INTEGER NOT NULL, viewer_keys TEXT NOT NULL)"
+)
+
+# 제목 / 시청자 이모지 검색 색인 (parsed_title을 내용으로 쓰는 FTS5, 트리거로 자동 갱신)
+TITLE_SEARCH_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS title_search USING fts5("
+    "title, viewer_keys, content='parsed_title', content_rowid='article_id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS parsed_title_ai AFTER INSERT ON parsed_title BEGIN "
+    "INSERT INTO title_search (rowid, title, viewer_keys) VALUES (new.article_id, new.title, new.viewer_keys); END",
+    "CREATE TRIGGER IF NOT EXISTS parsed_title_ad AFTER DELETE ON parsed_title BEGIN "
+    "INSERT INTO title_search (title_search, rowid, title, viewer_keys) "
+    "VALUES ('delete', old.article_id, old.title, old.viewer_keys); END",
+    "CREATE TRIGGER IF NOT EXISTS parsed_title_au AFTER UPDATE ON parsed_title BEGIN "
+    "INSERT INTO title_search (title_search, rowid, title, viewer_keys) "
+    "VALUES ('delete', old.article_id, old.title, old.viewer_keys); "
+    "INSERT INTO title_search (rowid, title, viewer_keys) VALUES (new.article_id, new.title, new.viewer_keys); END",
+]
+
+# 정수 설정값 (list_version: 목록 내용이 바뀔 때마다 증가, title_parser: 해석 결과를 만든 TITLE_PARSER_VERSION)
+META_SCHEMA = "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+
+
+# 게시물 DB 연결 (WAL 모드 - 크롤링 중에도 목록 조회가 막히지 않음, 이전 스키마는 변환)
+def connect_posted_link_db(db_path: str = POSTED_LINK_DB, check_same_thread: bool = True):
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    db_conn = sqlite3.connect(db_path, check_same_thread=check_same_thread)
+    db_conn.execute("PRAGMA journal_mode=WAL")
+    db_conn.execute("PRAGMA synchronous=NORMAL")
+    migrate_posted_link(db_conn)
+    return db_conn
+
+
+# 이전 스키마 (link TEXT, title TEXT, 키 없음)를 새 스키마로 변환 (한 트랜잭션, 같은 link가 여러 번 있으면 마지막 제목 사용)
+def migrate_posted_link(db_conn):
+    columns = [row[1] for row in db_conn.execute("PRAGMA table_info(posted_link)")]
+
+    db_conn.execute("BEGIN IMMEDIATE")
+    try:
+        if "link" in columns:
+            db_conn.execute("ALTER TABLE posted_link RENAME TO posted_link_legacy")
+        db_conn.execute(POSTED_LINK_SCHEMA)
+        if "link" in columns:
+            now = time.time()
+            db_conn.execute(
+                "INSERT INTO posted_link (article_id, title, first_seen_at, last_seen_at, updated_at) "
+                "SELECT CAST(link AS INTEGER), COALESCE(title, ''), ?, ?, ? FROM posted_link_legacy "
+                "WHERE CAST(link AS INTEGER) > 0 ORDER BY rowid "
+                "ON CONFLICT(article_id) DO UPDATE SET title = excluded.title",
+                (now, now, now),
+            )
+            db_conn.execute("DROP TABLE posted_link_legacy")
+
+        # 중단된 크롤링을 이어가기 위한 위치 (target_id: 이번 크롤링이 도달할 기존 최신 게시물, next_page: 다음 페이지)
+        db_conn.execute(
+            "CREATE TABLE IF NOT EXISTS crawl_cursor "
+            "(name TEXT PRIMARY KEY, target_id INTEGER, next_page INTEGER, per_page INTEGER, updated_at REAL)"
+        )
+
+        db_conn.execute(META_SCHEMA)
+        sync_parsed_titles(db_conn)
+        db_conn.commit()
+    except Exception:
+        db_conn.rollback()
+        raise
+
+
+def get_meta(db_conn, key: str, default: int = 0) -> int:
+    row = db_conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return default if row is None else row[0]
+
+
+# 해석 결과 갱신 (rows: [(article_id, 게시물 제목), ...], 제목이 같은 기존 행은 건드리지 않음)
+# 실제로 바뀐 행이 있으면 list_version을 올리고 True 반환 (호출한 쪽의 트랜잭션 안에서 실행)
+def upsert_parsed_titles(db_conn, rows) -> bool:
+    before = db_conn.total_changes
+    db_conn.executemany(
+        "INSERT INTO parsed_title (article_id, source_title, title, viewer, listed, viewer_keys) "
+        "VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(article_id) DO UPDATE SET "
+        "source_title = excluded.source_title, title = excluded.title, viewer = excluded.viewer, "
+        "listed = excluded.listed, viewer_keys = excluded.viewer_keys "
+        "WHERE parsed_title.source_title != excluded.source_title",
+        [(article_id, source_title, *parse_title(source_title)) for article_id, source_title in rows],
+    )
+    if db_conn.total_changes == before:
+        return False
+
+    db_conn.execute(
+        "INSERT INTO meta (key, value) VALUES ('list_version', 1) "
+        "ON CONFLICT(key) DO UPDATE SET value = value + 1"
+    )
+    return True
+
+
+# 해석 결과가 없는 게시물을 채움 (해석 방식이 바뀌었으면 테이블과 검색 색인을 새로 만들어 전체를 다시 계산)
+def sync_parsed_titles(db_conn):
+    if get_meta(db_conn, "title_parser") != TITLE_PARSER_VERSION:
+        db_conn.execute("DROP TABLE IF EXISTS title_search")
+        db_conn.execute("DROP TABLE IF EXISTS parsed_title")  # 트리거도 함께 삭제됨
+        db_conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('title_parser', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (TITLE_PARSER_VERSION,),
+        )
+
+    db_conn.execute(PARSED_TITLE_SCHEMA)
+    for statement in TITLE_SEARCH_SCHEMA:
+        db_conn.execute(statement)
+
+    missing = db_conn.execute(
+        "SELECT p.article_id, p.title FROM posted_link p "
+        "LEFT JOIN parsed_title t ON t.article_id = p.article_id WHERE t.article_id IS NULL"
+    ).fetchall()
+    if missing:
+        upsert_parsed_titles(db_conn, missing)
+
+
+# endregion
+
+
 class CrawlService:
     # region 초기 설정
-    def __init__(self):
-        # httpx AsyncHTTPTransport 초기화
-        self.transport = AsyncHTTPTransport(retries=1)
-
+    def __init__(self, db_path: str = POSTED_LINK_DB):
         # 유저의 게시물 링크를 저장할 DB
-        self.db_conn = sqlite3.connect("./database/posted_link.db")
-        db_cur = self.db_conn.cursor()
-        db_cur.execute("CREATE TABLE IF NOT EXISTS posted_link (link TEXT, title TEXT)")
-        self.db_conn.commit()
+        self.db_conn = connect_posted_link_db(db_path)
 
         load_dotenv("crawl.env")
     # endregion
 
     # region 게시물 찾기
     def find_article(self, response):
+        return self.filter_articles(response.json()["message"]["result"]["articleList"])
+
+    # 목록 중에서 반응정리 팀의 게시물만 선택
+    def filter_articles(self, articles):
         article_list = []
-        for article in response.json()["message"]["result"]["articleList"]:
+        for article in articles:
             if article["memberKey"] == os.getenv("NAVER_CAFE_REACTION_MEMBERKEY"):
                 article_list.append({"articleId": article["articleId"], "subject": article["subject"]})
         return article_list
     # endregion
 
-    # region DB에 게시물 저장
-    def save_db(self, article_list):
-        db_cur = self.db_conn.cursor()
+    # region 게시물 목록 요청
+    def list_url(self, page: int, per_page: int):
+        return (
+            os.getenv("NAVER_CAFE_ARTICLE_API")
+            + f"?search.clubid={os.getenv('NAVER_CAFE_CLUBID')}"
+            + f"&search.menuid={os.getenv('NAVER_CAFE_MENUID')}"
+            + "&search.queryType=lastArticle"
+            + f"&search.page={page}&search.perPage={per_page}"
+            + f"&uuid={uuid4()}"
+            + "&ad=false&adUnit=MW_CAFE_ARTICLE_LIST_RS"
+        )
 
-        for article in article_list[::-1]:
-            article_id = article['articleId']
-
-            # 링크가 이미 존재하는지 확인
-            db_cur.execute("SELECT title FROM posted_link WHERE link = ?", (article_id,))
-            existing_title = db_cur.fetchone()
-
-            if existing_title is None:
-                # 링크가 존재하지 않을 경우, 새로 삽입
-                db_cur.execute(
-                    "INSERT INTO posted_link (link, title) VALUES (?, ?)",
-                    (article_id, str(article["subject"])),
-                )
-            elif existing_title[0] != str(article["subject"]):
-                # 링크가 존재할 경우, 제목이 변경되었는지 확인
-                db_cur.execute(
-                    "UPDATE posted_link SET title = ? WHERE link = ?",
-                    (str(article["subject"]), article_id),
-                )
+    # 목록 한 페이지의 전체 게시물 (다른 회원의 게시물 포함, 최신순)
+    # 공유 HTTP 클라이언트 사용 (연결 재사용, 일시적인 오류는 다시 시도)
+    async def fetch_page(self, page: int, per_page: int):
+        response = await http_get(self.list_url(page, per_page))
+        return response.json()["message"]["result"]["articleList"]
+    # endregion
+
+    # region 크롤링 위치 저장
+    # DB에 저장된 가장 최신 게시물 id
+    def newest_article_id(self) -> int:
+        row = self.db_conn.execute("SELECT MAX(article_id) FROM posted_link").fetchone()
+        return row[0] or 0
+
+    # name: "refresh" (target_id까지 내려가는 크롤링), "head" (이어가기 전에 중단 이후 올라온 게시물을 받는 크롤링)
+    def load_cursor(self, name: str = "refresh"):
+        row = self.db_conn.execute(
+            "SELECT target_id, next_page, per_page FROM crawl_cursor WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"target_id": row[0], "next_page": row[1], "per_page": row[2]}
+
+    def save_cursor(self, target_id: int, next_page: int, per_page: int, name: str = "refresh"):
+        with self.db_conn:
+            self._write_cursor(name, target_id, next_page, per_page)
+
+    # 커밋하지 않음 (save_db에서 게시물과 같은 트랜잭션으로 기록)
+    def _write_cursor(self, name: str, target_id: int, next_page: int, per_page: int):
+        self.db_conn.execute(
+            "INSERT OR REPLACE INTO crawl_cursor VALUES (?, ?, ?, ?, ?)",
+            (name, target_id, next_page, per_page, time.time()),
+        )
+
+    def clear_cursor(self, name: str = "refresh"):
+        self.db_conn.execute("DELETE FROM crawl_cursor WHERE name = ?", (name,))
         self.db_conn.commit()
     # endregion
 
-    # region 게시물 크롤링
-    async def check_new_posts(self, max_page: int):
-        if not self.transport:
-            raise Exception("httpx AsyncHTTPTransport is not initialised or destoryed.")
-
-        async with (AsyncClient(transport=self.transport) as client):
-
-            # region 네이버 카페 게시물 가져오기
-            response = await client.get(
-                os.getenv("NAVER_CAFE_ARTICLE_API")
-                + f"?search.clubid={os.getenv('NAVER_CAFE_CLUBID')}"
-                + f"&search.menuid={os.getenv('NAVER_CAFE_MENUID')}"
-                + "&search.queryType=lastArticle"
-                + f"&search.page=1&search.perPage={max_page}"
-                + f"&uuid={uuid4()}"
-                + "&ad=false&adUnit=MW_CAFE_ARTICLE_LIST_RS",
+    # region DB에 게시물 저장
+    # 한 트랜잭션에서 일괄 upsert (새 게시물은 삽입, 기존 게시물은 마지막 확인 시각과 바뀐 제목만 갱신)
+    # 목록 화면용 해석 결과도 함께 갱신 -> 목록 내용이 바뀌었으면 True
+    # cursor: (이름, target_id, next_page, per_page) - 크롤링 위치도 같은 트랜잭션에서 저장
+    # (게시물만 저장되고 위치는 이전 값으로 남으면 새로 저장된 id가 기준이 되어 사이 게시물을 건너뜀)
+    def save_db(self, article_list, cursor: tuple = None) -> bool:
+        now = time.time()
+        with self.db_conn:
+            if cursor is not None:
+                self._write_cursor(*cursor)
+            self.db_conn.executemany(
+                "INSERT INTO posted_link (article_id, title, first_seen_at, last_seen_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(article_id) DO UPDATE SET "
+                "title = excluded.title, last_seen_at = excluded.last_seen_at, "
+                "updated_at = CASE WHEN title = excluded.title THEN updated_at ELSE excluded.updated_at END",
+                [(int(article["articleId"]), str(article["subject"]), now, now, now) for article in article_list[::-1]],
             )
+            return upsert_parsed_titles(
+                self.db_conn, [(int(article["articleId"]), str(article["subject"])) for article in article_list]
+            )
+    # endregion
 
-            response.raise_for_status()
-            # endregion
+    # region 게시물 크롤링
+    async def check_new_posts(self, max_page: int):
+        # region 네이버 카페 게시물 가져오기
+        articles = await self.fetch_page(1, max_page)
+        # endregion
 
-            article_list = self.find_article(response)
-            self.save_db(article_list)
+        article_list = self.filter_articles(articles)
+        self.save_db(article_list)
     # endregion
 
     # region 최근 게시물 전부 크롤링
-    async def crawl_until_known(self):
-        if not self.transport:
-            raise Exception("httpx AsyncHTTPTransport is not initialised or destoryed.")
-
+    # per_page, concurrency, max_pages의 기본값은 CRAWL_PER_PAGE (50), CRAWL_CONCURRENCY (4), CRAWL_MAX_PAGES (200) 환경 변수
+    # (기존 순차 방식은 per_page=10, concurrency=1)
+    async def crawl_until_known(self, per_page: int = None, concurrency: int = None, max_pages: int = None):
         # region DB 점검
         db_cur = self.db_conn.cursor()
 
@@ -94,43 +269,61 @@ class CrawlService:
             return
         # endregion
 
-        # region 기존 데이터 가져오기
-        db_cur.execute("SELECT link FROM posted_link ORDER BY link DESC LIMIT 1")
-        existing_id = db_cur.fetchone()[0]
-        self.db_conn.commit()
-        # endregion
-
-        # region 페이지 루프
-        total_article_list = []
-        page = 1
+        per_page = per_page or int(os.getenv("CRAWL_PER_PAGE", "50"))
+        concurrency = concurrency or int(os.getenv("CRAWL_CONCURRENCY", "4"))
+        max_pages = max_pages or int(os.getenv("CRAWL_MAX_PAGES", "200"))
 
-        async with AsyncClient(transport=self.transport) as client:
-            while True:
-                # region 네이버 카페 게시물 가져오기
-                response = await client.get(
-                    os.getenv("NAVER_CAFE_ARTICLE_API")
-                    + f"?search.clubid={os.getenv('NAVER_CAFE_CLUBID')}"
-                    + f"&search.menuid={os.getenv('NAVER_CAFE_MENUID')}"
-                    + "&search.queryType=lastArticle"
-                    + f"&search.page={page}&search.perPage=10"
-                    + f"&uuid={uuid4()}"
-                    + "&ad=false&adUnit=MW_CAFE_ARTICLE_LIST_RS",
-                )
+        cursor = self.load_cursor()
+        if cursor is None:
+            reached = await self.crawl_pages(1, self.newest_article_id(), per_page, concurrency, max_pages)
+        else:
+            # 중단된 크롤링 이어가기 (중단 이후 올라온 게시물을 먼저 받은 뒤 남은 페이지부터 진행)
+            # 멈추는 기준은 항상 저장된 target_id (newest_id는 중단 전에 저장한 페이지를 포함하므로 사용하지 않음)
+            # 앞부분 크롤링도 중단될 수 있으므로 그 기준은 "head" 위치로 남김 (몇 페이지뿐이므로 항상 1페이지부터)
+            head = self.load_cursor("head")
+            head_target = head["target_id"] if head is not None else self.newest_article_id()
+            if await self.crawl_pages(1, head_target, per_page, concurrency, max_pages, cursor_name="head"):
+                self.clear_cursor("head")
 
-                response.raise_for_status()
+            # per_page가 바뀌었으면 페이지 번호는 의미가 없으므로 1페이지부터 다시 확인
+            # max_pages는 한 번의 크롤링에서 요청하는 페이지 수 (이어가는 위치가 max_pages를 넘어도 진행)
+            start_page = self.resume_page(cursor, per_page)
+            reached = await self.crawl_pages(start_page, cursor["target_id"], per_page, concurrency,
+                                             start_page + max_pages - 1)
 
-                # 게시물 리스트 중에서 반응정리 팀의 게시물을 찾음
-                article_list = self.find_article(response)
+        # max_pages에서 멈췄으면 저장된 위치를 남겨 다음 크롤링에서 이어감
+        if reached:
+            self.clear_cursor()
 
-                # endregion
+    # 저장된 위치에서 다시 시작할 페이지 (목록 앞에 새 게시물이 추가되면 기존 게시물은 뒤로 밀리므로 겹칠 뿐 빠지지 않음)
+    def resume_page(self, cursor: dict, per_page: int) -> int:
+        return cursor["next_page"] if cursor["per_page"] == per_page else 1
 
-                # DB에 저장된 게시물이 포함되어있을 경우 종료
-                if int(existing_id) >= int(min([a['articleId'] for a in article_list])):
-                    self.save_db(total_article_list)
-                    return
+    # start_page부터 concurrency개 페이지씩 동시에 요청하여 target_id보다 새 게시물 저장
+    # 페이지에 target_id 이하 게시물이 나오면 (목록이 최신순이므로 이후 페이지는 모두 기존 게시물) 중단
+    # cursor_name: 페이지 묶음마다 게시물과 함께 다음 위치를 저장 (중단되면 다음 크롤링에서 이어감)
+    # -> target_id까지 도달했으면 True, max_pages 페이지까지 확인하고 멈췄으면 False
+    async def crawl_pages(self, start_page: int, target_id: int, per_page: int, concurrency: int, max_pages: int,
+                          cursor_name: str = "refresh") -> bool:
+        page = start_page
+        while page <= max_pages:
+            pages = list(range(page, min(max_pages, page + concurrency - 1) + 1))
+            results = await asyncio.gather(*(self.fetch_page(p, per_page) for p in pages))
 
-                total_article_list += article_list
-                page += 1
+            # 페이지 순서대로 확인 (중단 지점 이후 페이지의 결과는 사용하지 않음)
+            article_list = []
+            reached = False
+            for articles in results:
+                article_list += [a for a in self.filter_articles(articles) if int(a["articleId"]) > target_id]
+                # 빈 페이지는 목록의 끝
+                if not articles or min(int(a["articleId"]) for a in articles) <= target_id:
+                    reached = True
+                    break
 
-        # endregion
-    # endregion
\ No newline at end of file
+            # 게시물과 다음 위치를 한 트랜잭션에 저장 (끝까지 도달했으면 위치는 호출한 쪽에서 삭제)
+            page = pages[-1] + 1
+            self.save_db(article_list, (cursor_name, target_id, page, per_page) if not reached else None)
+            if reached:
+                return True
+        return False
+    # endregion
@@ -7,18 +7,23 @@ import warnings
 import json
 import threading
 import numpy as np
-import soundfile as sf
-import requests
-import zipfile
 
-from tempfile import TemporaryDirectory
+from urllib.parse import urlparse, parse_qs
 from bs4 import BeautifulSoup as bs
 # from pytubefix import YouTube  <-- Pytube 제거
 import yt_dlp  # yt-dlp 라이브러리 추가
 from dotenv import load_dotenv
 
+from .align_audio import align_file_task
+from .audio_utils import open_audio, ffmpeg_decode_to_wav
+from .compute_pool import get_compute_pool
+from .http_client import http_get
+from .media_cache import MediaCache, get_media_cache, link_or_copy
+from .pipeline import Pipeline, parse_concurrency
+from .zip_stream import manifest_entry, write_manifest
+
 # region 기존 함수들은 그대로 유지 (편의상 생략)
-# ... (change_to_youtube_url, get_viewer, process_title, get_html, format_time 함수는 동일)
+# ... (change_to_youtube_url, get_viewer, get_html, format_time 함수는 동일)
 # ... (FindStartTime 모듈은 현재 파일에 없으므로 주석 처리된 부분 유지)
 # endregion
 
@@ -41,6 +46,14 @@ def change_to_youtube_url(embed_url: str) -> str:
     return watch_url
 
 
+# 유튜브 URL에서 영상 id 추출 (없으면 None)
+def youtube_video_id(url: str):
+    parsed = urlparse(url)
+    if parsed.hostname and parsed.hostname.endswith("youtu.be"):
+        return parsed.path.lstrip("/") or None
+    return parse_qs(parsed.query).get("v", [None])[0]
+
+
 # endregion
 
 
@@ -83,30 +96,10 @@ def get_viewer(author: str, title: str) -> str:
 # endregion 로그인 함수
 
 
-# region 제목 처리
-def process_title(title: str) -> list:
-    if "했어요]" in title:
-        splited_title = title.split("했어요]")[1].replace(" 반응정리", "").split("/")
-    else:
-        splited_title = title.replace(" 반응정리", "").split("/")
-
-    final_title = "".join(splited_title[:-1])
-    viewer = splited_title[-1]
-
-    # 이모지 처리
-    viewer = viewer.replace("💙", "🩵")
-    viewer = viewer.replace("🖤", "💙")
-
-    return [final_title, viewer]
-
-
-# endregion
-
-
 # region HTML 가져오기
 async def get_html(article_id: str):
     url = f"{os.getenv('NAVER_CAFE_HTML_API')}/{os.getenv('NAVER_CAFE_ID')}/articles/{article_id}?useCafeId=false"
-    response = requests.get(url)
+    response = await http_get(url)
     data = response.json()
     # HTML 파싱
     soup = bs(data["result"]["article"]["contentHtml"], "html.parser")
@@ -149,39 +142,148 @@ def format_time(seconds: float) -> str:
 # endregion
 
 
+# region 호스트별 요청 속도 제한
+# rates: {호스트: 초당 요청 수} (하위 도메인 포함, 예: youtube.com -> www.youtube.com)
+# 요청 시작 시각을 호스트별로 1 / rate 간격으로 예약 (여러 작업과 이벤트 루프에서 공유 가능)
+class HostRateLimiter:
+    def __init__(self, rates: dict):
+        self.rates = rates
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    # "youtube.com=2,googlevideo.com=4" 형식
+    @classmethod
+    def from_string(cls, value: str):
+        rates = {}
+        for item in filter(None, (v.strip() for v in value.split(","))):
+            host, rate = item.split("=")
+            rates[host.strip().lower()] = float(rate)
+        return cls(rates)
+
+    def _match(self, host: str):
+        for configured in self.rates:
+            if host == configured or host.endswith("." + configured):
+                return configured
+        return None
+
+    async def acquire(self, url: str):
+        host = self._match((urlparse(url).hostname or "").lower())
+        if host is None or self.rates[host] <= 0:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + 1.0 / self.rates[host]
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+_rate_limiter = None
+
+
+# 프로세스 전체에서 공유하는 속도 제한기 (DOWNLOAD_RATE_LIMITS 환경 변수로 설정)
+def get_rate_limiter() -> HostRateLimiter:
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = HostRateLimiter.from_string(os.getenv("DOWNLOAD_RATE_LIMITS", "youtube.com=2"))
+    return _rate_limiter
+
+
+# endregion
+
+
 class DownloadAudio:
+    # yt-dlp 영상 포맷 (캐시 키에 포함되므로 바꾸면 새로 다운로드됨)
+    VIDEO_FORMAT = "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best"
+    VIDEO_SORT = "res:1080"
+
+    # 단계별 전체 진행률 구간 (%)
+    # download ~ archive는 제목별로 겹쳐서 진행되므로 각 단계의 완료 비율만큼 더해서 계산
+    # align은 정렬, 정제, 영상 병합 (정제 결과를 ffmpeg 파이프로 바로 전달)까지 포함
+    STAGE_RANGES = {
+        "extract": (0, 10),
+        "download": (10, 50),
+        "align": (50, 95),
+        "archive": (95, 100),
+    }
+
     # region 초기 설정
-    def __init__(self, progress_list: list):
+    # publish: 진행 이벤트를 받는 함수 (message, stage=, percent=)
+    # profile_reports: 주어지면 제목별 정렬 단계 측정 결과를 기록 (None이면 측정하지 않음)
+    # max_concurrency: 동시에 진행할 정보 추출 / 다운로드 수 (기본값은 DOWNLOAD_CONCURRENCY 환경 변수)
+    # single_fetch: True이면 영상을 한 번만 받고 오디오는 받은 MP4에서 바로 디코딩 (기본값은 DOWNLOAD_SINGLE_FETCH 환경 변수, 켜짐)
+    # stage_concurrency: 처리 단계별 동시 실행 수 {"download", "align", "archive"}
+    #   (기본값은 PIPELINE_CONCURRENCY 환경 변수, 예: "download=4,align=2" / download는 max_concurrency)
+    def __init__(self, publish, profile_reports: dict = None, max_concurrency: int = None, single_fetch: bool = None,
+                 stage_concurrency: dict = None):
         load_dotenv("crawl.env")
 
-        # 임시 폴더 생성
-        with TemporaryDirectory() as temp_dir:
-            self.temp_dir = temp_dir
-            self.raw_dir = os.path.join(self.temp_dir, "raw")
-            self.compiled_dir = os.path.join(self.temp_dir, "compiled")
-
-            os.mkdir(self.raw_dir)
-            os.mkdir(os.path.join(self.raw_dir, "audio"))
-            os.mkdir(self.compiled_dir)
-
         # yotubes_dict는 이제 URL을 저장합니다.
         self.youtubes_dict = {}
         self.origin_audio = None
+        self.origin_path = None
+        self.origin_name = None
+        self.origin_pcm_path = None
+        self.origin_mono_path = None
+        self._origin_lock = threading.Lock()
+        self.origin_ready = None
+        self.video_paths = {}
+        self.audio_paths = {}  # 정렬에 쓸 오디오 (single_fetch이면 영상 파일 자체)
+        # 작업 폴더 (download_audio에서 작업별 ./video/<게시글 id>/<작업 id>로 설정)
+        self.raw_dir = None
+        self.bundle_dir = None
         self.download_path = "./video"
         self.music_title = "음악"
-        self.progress_list = progress_list
+        self.publish = publish
+        self.profile_reports = profile_reports
+        self.stage = None
+        self.percent = 0.0
+
+        self.max_concurrency = max_concurrency or int(os.getenv("DOWNLOAD_CONCURRENCY", "4"))
+        self.rate_limiter = get_rate_limiter()
+        self.semaphore = None
+        self.single_fetch = single_fetch if single_fetch is not None else os.getenv("DOWNLOAD_SINGLE_FETCH", "1") != "0"
+
+        # 정렬은 CPU를 많이 쓰므로 기본 1개
+        self.stage_concurrency = {"download": self.max_concurrency, "align": 1, "archive": 1}
+        self.stage_concurrency.update(parse_concurrency(os.getenv("PIPELINE_CONCURRENCY", "")))
+        self.stage_concurrency.update(stage_concurrency or {})
+        self.stage_progress = {}
+
+        # 다운로드 캐시 (WAV는 yt-dlp로 따로 받는 경우에만 저장, 모노 신호는 오디오 출처에 따라 다른 항목)
+        self.cache = get_media_cache()
+        self.cache_keys = {}
+        self.wav_kind = "wav" if self.single_fetch else "wav-opus"
 
     # endregion
 
     # region 진행 상황 출력
+    # 현재 단계에서 done / total만큼 진행했을 때의 전체 진행률 갱신
+    def set_stage(self, stage: str, done: int = 0, total: int = 1):
+        low, high = self.STAGE_RANGES[stage]
+        self.stage = stage
+        self.percent = round(low + (high - low) * done / max(1, total), 1)
+
+    # 파이프라인 단계에서 항목이 끝났을 때 (각 단계 완료 비율의 합으로 전체 진행률 계산)
+    def set_pipeline_stage(self, stage: str, done: int, total: int):
+        self.stage = stage
+        self.stage_progress[stage] = done / max(1, total)
+        percent = self.STAGE_RANGES["download"][0]
+        for name, fraction in self.stage_progress.items():
+            low, high = self.STAGE_RANGES[name]
+            percent += (high - low) * fraction
+        self.percent = round(percent, 1)
+
     async def write_progress(self, message: str):
-        self.progress_list.append(message)
+        self.publish(message, stage=self.stage, percent=self.percent)
         print(message)
 
     # endregion
 
-    # region ffmpeg 변환
-    async def ffmpeg_convert_file(self, command: list):
+    # region ffmpeg 변환 (성공 여부 반환)
+    async def ffmpeg_convert_file(self, command: list) -> bool:
         # yt-dlp가 오디오 변환을 처리하므로 이 함수는 merge_audio에서만 사용됩니다.
         try:
             conv_result = await asyncio.to_thread(
@@ -191,15 +293,56 @@ class DownloadAudio:
         except subprocess.CalledProcessError as e:
             err_msg = e.stderr.decode(errors="replace")
             await self.write_progress(f"FFMPEG error for {command}: {err_msg}")
-            return
+            return False
         except Exception as e:
             await self.write_progress(f"FFMPEG exception for {command}: {e}")
-            return
+            return False
+        return True
+
+    # endregion
+
+    # region 동시 실행 (semaphore로 개수 제한, 완료될 때마다 현재 단계 진행률 갱신)
+    async def run_bounded(self, func, items: list) -> list:
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        stage = self.stage
+        done = 0
+
+        async def run(item):
+            nonlocal done
+            async with self.semaphore:
+                result = await func(item)
+            done += 1
+            self.set_stage(stage, done, len(items))
+            return result
+
+        return await asyncio.gather(*(run(item) for item in items))
+
+    # endregion
+
+    # region 유튜브 영상 정보 추출 (실패하면 None)
+    async def extract_info(self, link: str):
+        await self.rate_limiter.acquire(link)
+        try:
+            # NEW: yt-dlp로 정보 추출 (Pytube 대체)
+            ydl_opts = {'quiet': True, 'noprogress': True}
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                return await asyncio.to_thread(ydl.extract_info, link, download=False)
+        except Exception as e:
+            print(f"Error: {link} : {e}")
+            return None
 
     # endregion
 
-    # region 유튜브 다운로드 (yt-dlp 사용)
-    async def download_youtube(self, title: str, output_path: str = None):
+    # yt-dlp가 출력한 최종 파일 경로 (출력이 없으면 기본 mp4 경로)
+    @staticmethod
+    def _printed_path(result, output_path: str, title: str) -> str:
+        printed = result.stdout.decode(errors="replace").strip().splitlines()
+        return printed[-1] if printed else os.path.join(output_path, f"{title}.mp4")
+
+    # region 유튜브 다운로드 (yt-dlp 사용, 성공 여부 반환)
+    async def download_youtube(self, title: str, output_path: str = None) -> bool:
         if output_path is None:
             output_path = self.raw_dir
 
@@ -207,146 +350,208 @@ class DownloadAudio:
 
         if url_to_download is None:
             await self.write_progress(f"Error: URL not found for {title}")
-            return
+            return False
 
+        audio_wav_path = os.path.join(output_path, f"{title}.wav")
+
+        # 캐시에 필요한 파일이 모두 있으면 다운로드 없이 작업 폴더로 연결 (single_fetch이면 영상만 필요)
+        video_id = youtube_video_id(url_to_download)
+        cache_key = None
+        if video_id is not None:
+            cache_key = MediaCache.key(video_id, f"{self.VIDEO_FORMAT}|{self.VIDEO_SORT}")
+            self.cache_keys[title] = cache_key
+
+            cached_video = self.cache.get(cache_key, "video")
+            cached_wav = None if self.single_fetch else self.cache.get(cache_key, self.wav_kind)
+            if cached_video is not None and (self.single_fetch or cached_wav is not None):
+                video_path = os.path.join(output_path, title + os.path.splitext(cached_video)[1])
+                try:
+                    await asyncio.to_thread(link_or_copy, cached_video, video_path)
+                    if not self.single_fetch:
+                        await asyncio.to_thread(link_or_copy, cached_wav, audio_wav_path)
+                except OSError as e:
+                    # 조회와 연결 사이에 캐시 정리로 삭제된 경우 등 -> 다시 다운로드
+                    await self.write_progress(f"Cache entry for {title} unavailable ({e}), downloading again")
+                else:
+                    self.video_paths[title] = video_path
+                    self.audio_paths[title] = video_path if self.single_fetch else audio_wav_path
+                    await self.write_progress(f"Loaded {title} from cache")
+                    return True
+
+        await self.rate_limiter.acquire(url_to_download)
         await self.write_progress(f"Downloading {title}...")
 
         # 1. 비디오 + 오디오 (MP4 컨테이너) 다운로드
         # yt-dlp가 최적의 비디오/오디오 스트림을 다운로드하고 MP4로 병합합니다.
+        # 최종 파일 경로는 병합/변환 후 yt-dlp가 출력하는 값을 사용 (best 포맷은 mp4가 아닐 수 있음)
         video_output_template = os.path.join(output_path, f"{title}.%(ext)s")
 
         video_command = [
             "yt-dlp",
-            "-f", "bestvideo[ext=mp4]+bestaudio[ext=m4a]/best",  # 최적의 mp4 포맷 선택
+            "-f", self.VIDEO_FORMAT,  # 최적의 mp4 포맷 선택
             url_to_download,
             "-o", video_output_template,
             "--merge-output-format", "mp4",
-            "-S", "res:1080",  # 1080p 해상도 우선
-            "--no-warnings"
-        ]
-
-        # 2. 오디오 스트림 추출 및 WAV 파일로 변환
-        # yt-dlp의 포스트프로세서를 사용하여 WAV 변환을 자동으로 수행합니다.
-        audio_wav_path = os.path.join(output_path, f"{title}.wav")
-
-        audio_command = [
-            "yt-dlp",
-            "-f", "bestaudio[ext=webm][acodec=opus]/bestaudio/best",  # 최고의 오디오 스트림 선택 (Opus 또는 AAC)
-            url_to_download,
-            "-o", audio_wav_path,
-            "--extract-audio",  # 오디오 추출 활성화
-            "--audio-format", "wav",  # WAV 포맷으로 출력
-            "--audio-quality", "0",  # 최고 품질 (무손실 WAV)
-            "--postprocessor-args", "AudioConvertor:-ac 2 -ar 44100",  # 채널 2, 샘플레이트 44.1kHz 지정
+            "-S", self.VIDEO_SORT,  # 1080p 해상도 우선
+            "--print", "after_move:filepath",
             "--no-warnings"
         ]
 
+        # 2. 오디오 스트림 준비
         try:
-            # yt-dlp 명령어를 비동기로 실행
-            video_task = asyncio.to_thread(subprocess.run, video_command, check=True, stdout=subprocess.PIPE,
-                                           stderr=subprocess.PIPE)
-            audio_task = asyncio.to_thread(subprocess.run, audio_command, check=True, stdout=subprocess.PIPE,
-                                           stderr=subprocess.PIPE)
-
-            # 두 작업을 동시에 실행
-            await asyncio.gather(video_task, audio_task)
+            if self.single_fetch:
+                # 한 번만 받은 MP4의 오디오 스트림을 정렬 단계에서 ffmpeg 파이프로 바로 디코딩 (WAV 파일 없음)
+                video_result = await asyncio.to_thread(subprocess.run, video_command, check=True,
+                                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                video_path = self._printed_path(video_result, output_path, title)
+                audio_path = video_path
+            else:
+                # yt-dlp의 포스트프로세서를 사용하여 WAV 변환을 자동으로 수행합니다.
+                audio_command = [
+                    "yt-dlp",
+                    "-f", "bestaudio[ext=webm][acodec=opus]/bestaudio/best",  # 최고의 오디오 스트림 선택 (Opus 또는 AAC)
+                    url_to_download,
+                    "-o", audio_wav_path,
+                    "--extract-audio",  # 오디오 추출 활성화
+                    "--audio-format", "wav",  # WAV 포맷으로 출력
+                    "--audio-quality", "0",  # 최고 품질 (무손실 WAV)
+                    "--postprocessor-args", "AudioConvertor:-ac 2 -ar 44100",  # 채널 2, 샘플레이트 44.1kHz 지정
+                    "--no-warnings"
+                ]
+
+                # yt-dlp 명령어를 비동기로 실행
+                video_task = asyncio.to_thread(subprocess.run, video_command, check=True, stdout=subprocess.PIPE,
+                                               stderr=subprocess.PIPE)
+                audio_task = asyncio.to_thread(subprocess.run, audio_command, check=True, stdout=subprocess.PIPE,
+                                               stderr=subprocess.PIPE)
+
+                # 두 작업을 동시에 실행
+                video_result, _ = await asyncio.gather(video_task, audio_task)
+                video_path = self._printed_path(video_result, output_path, title)
+                audio_path = audio_wav_path
+
+            # 다음 요청을 위해 캐시에 저장 (같은 파일 시스템이면 하드 링크)
+            if cache_key is not None:
+                await asyncio.to_thread(self.cache.put, cache_key, "video", video_path)
+                if not self.single_fetch:
+                    await asyncio.to_thread(self.cache.put, cache_key, self.wav_kind, audio_wav_path)
 
         except subprocess.CalledProcessError as e:
             err_msg = e.stderr.decode(errors="replace")
             await self.write_progress(f"YT-DLP process error for {title}: {err_msg}")
-            return
+            return False
         except Exception as e:
             await self.write_progress(f"Download/Process error for {title}: {e}")
-            return
+            return False
 
+        self.video_paths[title] = video_path
+        self.audio_paths[title] = audio_path
         await self.write_progress(f"Downloaded and Converted {title}")
+        return True
 
     # endregion
 
-    # region 동영상 파일 시간 조정
-    async def adjust_audio_start_time(self, title: str):
-        # yt-dlp로 WAV 파일이 생성되었으므로, WAV 파일을 바로 사용
-        audio, sr = await asyncio.to_thread(
-            sf.read, f"{self.raw_dir}/{title}.wav", dtype='float32'
-        )
-
-        start_index = 0  # await find_time(self.origin_audio, audio[0]) * 512
-        start_time = start_index / sr
+    # region 원본 오디오 준비 -> (원본 WAV 경로, 정렬용 모노 신호 .npy 경로)
+    # 작업 프로세스들이 메모리 맵으로 함께 읽도록 원본을 한 번만 디코딩 (영상 파일이면 16비트 WAV로 저장)
+    # 캐시에 있으면 그 경로, 없으면 변환 후 캐시 (캐시 키가 없으면 작업 폴더)에 저장
+    # 같은 게시글의 반응 영상들이 함께 쓰므로 한 번 정한 경로는 유지 (정렬 단계가 동시에 호출해도 한 번만 변환)
+    def load_origin_audio(self) -> tuple:
+        with self._origin_lock:
+            if os.path.splitext(self.origin_path)[1].lower() == ".wav":
+                self.origin_pcm_path = self.origin_path
+            elif self.origin_pcm_path is None or not os.path.exists(self.origin_pcm_path):
+                self.origin_pcm_path = self._origin_file("pcm", "wav", self._decode_origin)
+            if self.origin_mono_path is None or not os.path.exists(self.origin_mono_path):
+                self.origin_mono_path = self._origin_file(f"{self.wav_kind}-mono", "npy", self._save_origin_mono)
+            return self.origin_pcm_path, self.origin_mono_path
+
+    # 원본 파생 파일 경로 (캐시 -> 없으면 make(임시 경로)로 만든 뒤 캐시 또는 작업 폴더에 저장)
+    def _origin_file(self, kind: str, ext: str, make) -> str:
+        cache_key = self.cache_keys.get(self.origin_name)
+        if cache_key is None:
+            return make(os.path.join(self.raw_dir, f"{self.origin_name}.{kind}.{ext}"))
+
+        path = self.cache.get(cache_key, kind)
+        if path is None:
+            with self.cache.writer(cache_key, kind, ext) as temp_path:
+                make(temp_path)
+            path = os.path.join(self.cache.root, f"{cache_key}.{kind}.{ext}")
+        return path
+
+    def _decode_origin(self, path: str) -> str:
+        return ffmpeg_decode_to_wav(self.origin_path, path)
+
+    def _save_origin_mono(self, path: str) -> str:
+        with open(path, "wb") as f:
+            np.save(f, np.asarray(open_audio(self.origin_pcm_path).mono(), dtype=np.float32))
+        return path
 
-        await asyncio.to_thread(
-            sf.write,
-            f"{self.compiled_dir}/{title}.wav",
-            audio[:, start_index:] if audio.ndim > 1 else audio[start_index:],
-            sr,
-        )
-
-        formateed_time = format_time(start_time)
-        ffmpeg_merge_command = [
-            "ffmpeg",
-            "-y",
-            "-ss",
-            formateed_time,  # 시작 시간
-            "-i",
-            f"{self.raw_dir}/{title}.mp4",  # 입력 비디오 파일
-            "-c",
-            "copy",  # 비디오와 오디오를 재인코딩하지 않고 복사
-            f"{self.compiled_dir}/{title}.mp4",  # 출력 비디오 파일
-        ]
+    # endregion
 
-        result = await asyncio.to_thread(
-            subprocess.run,
-            ffmpeg_merge_command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
+    # region 동영상 파일 시간 조정 (성공 여부 반환)
+    # 원본에 맞춰 정렬 및 배경음 제거 후 정제된 오디오를 ffmpeg 파이프로 바로 영상과 병합 (bundle 폴더에 mkv 기록)
+    # 정제된 오디오 길이는 반응 영상과 같으므로 시작 시간은 그대로 (영상을 잘라낼 필요 없음)
+    async def adjust_audio_start_time(self, title: str) -> bool:
+        if self.origin_path is None or not os.path.exists(self.origin_path):
+            # 원본이 없으면 받은 오디오를 그대로 병합
+            return await self.merge_audio(title, self.audio_paths[title])
+
+        # 계산은 공유 작업 풀의 프로세스에서 실행 (입력은 파일 경로만 전달)
+        profile = self.profile_reports is not None
+        ref_path, ref_mono_path = await asyncio.to_thread(self.load_origin_audio)
+        try:
+            result = await get_compute_pool().run(
+                align_file_task, ref_path, self.audio_paths[title], f"{self.bundle_dir}/{title}.mkv",
+                ref_mono_path=ref_mono_path, use_store=True, profile=profile, video_path=self.video_paths[title],
+            )
+        except Exception as e:
+            await self.write_progress(f"Error adjusting {title}: {e}")
+            return False
 
-        if result.returncode != 0:
-            err_msg = result.stderr.decode(errors="replace")
-            await self.write_progress(f"Error adjusting {title}: {err_msg}")
-        else:
-            await self.write_progress(f"Adjusted {title}")
+        if profile:
+            self.profile_reports[title] = result[1]
+        await self.write_progress(f"Adjusted {title}")
+        return True
 
     # endregion
 
-    # region 오디오 병합 (기존 로직 유지)
-    async def merge_audio(self, title: str):
-        # yt-dlp로 다운로드한 mp4와 ffmpeg로 추출된 wav 파일을 병합합니다.
+    # region 오디오 병합 (성공 여부 반환)
+    async def merge_audio(self, title: str, audio_path: str) -> bool:
+        # yt-dlp로 다운로드한 영상과 오디오 파일을 병합합니다.
         ffmpeg_merge_command = [
             "ffmpeg",
             "-y",  # 덮어쓰기 옵션
             "-i",
-            f"{self.compiled_dir}/{title}.mp4",  # 비디오 파일
+            self.video_paths[title],  # 비디오 파일
             "-i",
-            f"{self.compiled_dir}/{title}.wav",  # WAV 오디오 파일
+            audio_path,  # 오디오 파일
             "-c:v",
             "copy",  # 비디오 스트림은 재인코딩 없이 그대로 복사
             "-map",
             "0:v:0",  # 첫 번째 입력의 비디오 스트림 선택
             "-map",
             "1:a:0",  # 두 번째 입력의 오디오 스트림 선택
-            f"{self.temp_dir}/{title}.mkv",
+            f"{self.bundle_dir}/{title}.mkv",
         ]
 
-        await self.ffmpeg_convert_file(ffmpeg_merge_command)
+        if not await self.ffmpeg_convert_file(ffmpeg_merge_command):
+            return False
+
         await self.write_progress(f"Merged {title}")
+        return True
 
     # endregion
 
-    # region ZIP 파일 생성 (기존 로직 유지)
-    async def create_zip(self, output_path: str, zip_name: str):
-        zip_path = os.path.join(output_path, zip_name)
-        with zipfile.ZipFile(zip_path, "w") as zipf:
-            for entry in os.listdir(self.temp_dir):
-                entry_path = os.path.join(self.temp_dir, entry)
-                if os.path.isfile(entry_path) and entry_path.endswith(".mkv"):
-                    zipf.write(entry_path, arcname=entry)
-
-        return zip_path
+    # region 묶음 완성 (ZIP은 다운로드 요청 시 무압축으로 바로 생성하여 전송)
+    # entries: 파이프라인에서 파일별로 미리 계산한 manifest 항목
+    async def create_bundle(self, entries: list = None):
+        return await asyncio.to_thread(write_manifest, self.bundle_dir, entries)
 
     # endregion
 
     # region 최종 다운로드 함수 (yt-dlp 정보 추출 사용)
-    async def download_audio(self, url_id: str):
+    # job_id: 작업 id (같은 게시글의 작업이 여러 번 실행돼도 작업마다 다른 폴더 사용)
+    async def download_audio(self, url_id: str, job_id: str = None):
         print("Downloading audio...")
         # 유튜브 링크 가져오기
         youtube_links = await get_html(url_id)
@@ -356,22 +561,18 @@ class DownloadAudio:
             raise Exception("No link found")
         # endregion
 
-        # region 유튜브 영상 정보 추출 및 링크 저장
-        for link in youtube_links:
-            try:
-                # NEW: yt-dlp로 정보 추출 (Pytube 대체)
-                ydl_opts = {'quiet': True, 'noprogress': True}
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = await asyncio.to_thread(ydl.extract_info, link, download=False)
+        # region 유튜브 영상 정보 추출 및 링크 저장 (동시 실행, 결과는 링크 순서대로 저장)
+        self.set_stage("extract")
+        infos = await self.run_bounded(self.extract_info, youtube_links)
 
-                author = info.get('uploader', 'Unknown Author')
-                title = info.get('title', 'Unknown Title')
+        for link, info in zip(youtube_links, infos):
+            if info is None:
+                continue
 
-                self.youtubes_dict[get_viewer(author, title)] = link  # URL 저장
+            author = info.get('uploader', 'Unknown Author')
+            title = info.get('title', 'Unknown Title')
 
-            except Exception as e:
-                print(f"Error: {link} : {e}")
-                pass
+            self.youtubes_dict[get_viewer(author, title)] = link  # URL 저장
         # endregion
 
         if len(self.youtubes_dict) <= 1:  # 원본 포함이므로 <= 1이면 영상이 부족함
@@ -386,32 +587,62 @@ class DownloadAudio:
             )
             default_name = list(self.youtubes_dict.keys())[0]
 
-        # region 원본 영상 처리
-        await self.download_youtube(default_name, output_path="./video")  # is_original 플래그 제거
-        '''
-        await self.merge_audio(default_name)
-        del self.youtubes_dict[default_name]
-        # endregion
+        # 작업별 폴더 (./video/<게시글 id>/<작업 id>, 같은 게시글을 다시 처리해도 전송 중인 묶음을 덮어쓰지 않도록)
+        # 완성된 영상은 bundle 폴더에 모아 전송 후 작업 폴더째 삭제
+        work_dir = os.path.join(self.download_path, url_id, job_id) if job_id else os.path.join(self.download_path, url_id)
+        self.raw_dir = work_dir
+        self.bundle_dir = os.path.join(work_dir, "bundle")
+        os.makedirs(self.bundle_dir, exist_ok=True)
+
+        self.origin_name = default_name
+        self.origin_ready = asyncio.Event()
 
-        # 원본 오디오 로드 (yt-dlp가 생성한 WAV 파일을 로드)
-        audio_data, sr = await asyncio.to_thread(
-            sf.read, f"./video/원본.wav", dtype='float32'
+        # region 제목별 파이프라인 (다운로드 -> 정렬 및 병합 -> 묶음 등록)
+        # 다운로드가 끝난 제목은 다른 제목의 다운로드를 기다리지 않고 바로 정렬 단계로 넘어감
+        # 원본은 정렬 기준이므로 다운로드만 하고, 정렬 단계는 원본 다운로드가 끝날 때까지 대기
+        entries = []
+
+        async def download(title):
+            try:
+                ok = await self.download_youtube(title)
+            finally:
+                if title == self.origin_name:
+                    self.origin_path = self.audio_paths.get(title)
+                    self.origin_ready.set()
+            return ok and title != self.origin_name
+
+        async def align(title):
+            await self.origin_ready.wait()
+            return await self.adjust_audio_start_time(title)
+
+        async def add_to_bundle(title):
+            entries.append(await asyncio.to_thread(manifest_entry, f"{self.bundle_dir}/{title}.mkv"))
+
+        pipeline = Pipeline(
+            [
+                ("download", download, self.stage_concurrency["download"]),
+                ("align", align, self.stage_concurrency["align"]),
+                ("archive", add_to_bundle, self.stage_concurrency["archive"]),
+            ],
+            # 원본은 다운로드 단계에서 빠지므로 이후 단계의 전체 수에서 제외
+            on_progress=lambda stage, done, total: self.set_pipeline_stage(
+                stage, done, total if stage == "download" else total - 1
+            ),
         )
 
-        self.origin_audio = audio_data
-        '''
-        # region 다운로드 및 시간 조정
-        for key in self.youtubes_dict.keys():
-            await self.download_youtube(key, output_path="./video")
+        # 원본을 먼저 넣어 정렬 단계가 최대한 빨리 시작되도록 함
+        titles = sorted(self.youtubes_dict.keys(), key=lambda title: title != self.origin_name)
+        completed = await pipeline.run(titles)
 
-        print(f"All video downloaded for {url_id}")
+        for title, (stage, error) in pipeline.errors.items():
+            await self.write_progress(f"Error in {stage} for {title}: {error}")
 
-        raise Exception("Test Exception - Remove this line after testing")
-        for key in self.youtubes_dict.keys():
-            await self.adjust_audio_start_time(key)
-            await self.merge_audio(key)
+        if len(completed) == 0:
+            raise Exception("No video processed")
 
-        await self.create_zip(output_path=self.download_path, zip_name=f"{url_id}.zip")
+        await self.create_bundle(entries)
+        self.set_stage("archive", 1, 1)
+        await self.write_progress(f"Archived {url_id}")
         # endregion
 
     # endregion
\ No newline at end of file
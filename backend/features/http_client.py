@@ -0,0 +1,136 @@
+import asyncio
+import os
+import random
+import weakref
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (httpx의 HTTP/2 지원에 필요)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# region 설정
+# HTTP_TIMEOUT: 읽기 / 쓰기 제한 시간 (초), HTTP_CONNECT_TIMEOUT: 연결 제한 시간 (초)
+# HTTP_MAX_CONNECTIONS / HTTP_MAX_KEEPALIVE: 연결 풀 크기, HTTP_RETRIES: 실패한 요청을 다시 시도하는 횟수
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+
+# 다시 시도할 응답 상태 코드 (요청 제한, 일시적인 서버 오류)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# 다시 시도 대기 시간 = BACKOFF_BASE * 2^(시도 횟수) (최대 BACKOFF_MAX초, 무작위 지연 추가)
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 10.0
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/120.0 Safari/537.36",
+    "Accept": "application/json, text/plain, */*",
+}
+
+
+# endregion
+
+
+# region 공유 HTTP 클라이언트
+# 연결 (TCP / TLS)을 재사용하도록 이벤트 루프마다 하나의 AsyncClient를 공유
+# (httpx 연결은 만든 이벤트 루프에서만 쓸 수 있으므로 작업 관리자 루프, API 루프마다 따로 생성)
+_http_clients = weakref.WeakKeyDictionary()
+
+
+def create_http_client() -> httpx.AsyncClient:
+    # 전송 계층을 직접 주면 AsyncClient의 limits / http2 인자는 무시되므로 연결 풀 설정은 전송 계층에 전달
+    # 연결 실패는 전송 계층에서 바로 다시 시도, 응답 오류는 request_with_retry에서 처리
+    transport = httpx.AsyncHTTPTransport(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+        retries=1,
+    )
+    return httpx.AsyncClient(
+        headers=HEADERS,
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        transport=transport,
+        follow_redirects=True,
+    )
+
+
+# 현재 이벤트 루프의 공유 클라이언트 (닫혀 있으면 새로 생성)
+def get_http_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = _http_clients[loop] = create_http_client()
+    return client
+
+
+# 현재 이벤트 루프의 공유 클라이언트 종료 (루프를 닫기 전에 호출)
+async def close_http_client():
+    client = _http_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+# 백그라운드 스레드에서 이벤트 루프 실행 (루프가 멈추면 공유 클라이언트의 연결을 닫고 루프 종료)
+def run_event_loop(loop: asyncio.AbstractEventLoop):
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_forever()
+    finally:
+        loop.run_until_complete(close_http_client())
+        loop.close()
+
+
+# run_event_loop로 실행 중인 루프를 멈추고 정리가 끝날 때까지 대기 (atexit 등에서 호출)
+def stop_event_loop(loop: asyncio.AbstractEventLoop, thread, timeout: float = 5):
+    try:
+        loop.call_soon_threadsafe(loop.stop)
+    except RuntimeError:
+        # 이미 닫힌 루프
+        pass
+    thread.join(timeout)
+
+
+# endregion
+
+
+# region 요청
+def _retry_delay(attempt: int, response: httpx.Response = None) -> float:
+    # 서버가 Retry-After (초)를 알려주면 그대로 따름
+    if response is not None:
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX)
+    delay = min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+# 공유 클라이언트로 요청 (연결 / 읽기 오류, RETRY_STATUS 응답은 지수 백오프로 다시 시도)
+# 다시 시도해도 실패하면 마지막 오류를 그대로 발생 (오류 상태 코드는 httpx.HTTPStatusError)
+async def request_with_retry(method: str, url: str, retries: int = None, **kwargs) -> httpx.Response:
+    retries = HTTP_RETRIES if retries is None else retries
+    client = get_http_client()
+
+    for attempt in range(retries + 1):
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+            await asyncio.sleep(_retry_delay(attempt))
+            continue
+
+        if response.status_code in RETRY_STATUS and attempt < retries:
+            await asyncio.sleep(_retry_delay(attempt, response))
+            continue
+        return response.raise_for_status()
+
+
+async def http_get(url: str, **kwargs) -> httpx.Response:
+    return await request_with_retry("GET", url, **kwargs)
+
+
+# endregion
@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import time
+
+from collections import OrderedDict
+from uuid import uuid4
+
+from .http_client import run_event_loop, stop_event_loop
+
+
+# region 작업 상태
+
+# 진행 이벤트 목록 (추가되거나 작업 상태가 바뀌면 기다리는 스트림을 깨움)
+# 이벤트: {"seq", "message", "stage", "percent", "time"}
+class ProgressLog(list):
+    def __init__(self):
+        super().__init__()
+        self.changed = threading.Condition()
+
+    def append(self, event):
+        with self.changed:
+            super().append(event)
+            self.changed.notify_all()
+
+    def notify(self):
+        with self.changed:
+            self.changed.notify_all()
+
+    # since 이후 이벤트가 생기거나 done()이 참이 될 때까지 대기 (timeout이 지나면 빈 목록)
+    def wait(self, since: int, done, timeout: float):
+        with self.changed:
+            self.changed.wait_for(lambda: len(self) > since or done(), timeout)
+            return self[since:]
+
+
+class Job:
+    def __init__(self, article_id: str):
+        self.id = uuid4().hex
+        self.article_id = article_id
+        self.status = "queued"  # queued -> running -> done / failed
+        self.progress = ProgressLog()
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # 이 작업을 요청한 수 (진행 중에 같은 게시글을 요청하면 증가)와 전체 전송이 끝난 수
+        self.requesters = 1
+        self.deliveries = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def set_status(self, status: str, error: str = None):
+        self.status = status
+        self.error = error
+        if status == "running":
+            self.started_at = time.time()
+        elif self.finished:
+            self.finished_at = time.time()
+        self.progress.notify()
+
+    # 진행 이벤트 기록 (stage: 처리 단계, percent: 전체 진행률 0~100)
+    def publish(self, message: str, stage: str = None, percent: float = None):
+        self.progress.append({
+            "seq": len(self.progress) + 1,
+            "message": message,
+            "stage": stage,
+            "percent": percent,
+            "time": time.time(),
+        })
+
+    # since: 이미 받은 진행 메시지 수 (그 이후 메시지만 반환)
+    def to_dict(self, since: int = 0) -> dict:
+        return {
+            "job_id": self.id,
+            "article_id": self.article_id,
+            "status": self.status,
+            "progress": self.progress[since:],
+            "progress_count": len(self.progress),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+# endregion
+
+
+# region 작업 관리자
+# 백그라운드 스레드의 이벤트 루프에서 작업을 실행 (동시 실행 수는 max_workers로 제한)
+# runner: Job을 받아 실행하는 코루틴 함수 (진행 상황은 job.publish로 기록)
+class JobManager:
+    def __init__(self, runner, max_workers: int = 2, max_history: int = 100):
+        self.runner = runner
+        self.max_workers = max_workers
+        self.max_history = max_history
+
+        self._jobs = OrderedDict()
+        self._active = {}  # 게시글 id -> 대기 중이거나 실행 중인 작업
+        self._lock = threading.Lock()
+
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = None
+        self._thread = threading.Thread(target=run_event_loop, args=(self._loop,), name="job-manager", daemon=True)
+        self._thread.start()
+
+    # 이벤트 루프를 멈추고 공유 HTTP 클라이언트 종료 (실행 중인 작업은 취소되지 않고 버려짐)
+    def shutdown(self, timeout: float = 5):
+        stop_event_loop(self._loop, self._thread, timeout)
+
+    # 작업 등록 (같은 게시글의 작업이 이미 진행 중이면 그 작업을 반환) -> (작업, 새로 생성 여부)
+    def submit(self, article_id: str):
+        with self._lock:
+            job = self._active.get(article_id)
+            if job is not None:
+                job.requesters += 1
+                return job, False
+
+            job = Job(article_id)
+            self._jobs[job.id] = job
+            self._active[article_id] = job
+            self._prune()
+
+        asyncio.run_coroutine_threadsafe(self._run(job), self._loop)
+        return job, True
+
+    def get(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    # 대기 중이거나 실행 중인 작업 id
+    def active_ids(self) -> set:
+        with self._lock:
+            return {job.id for job in self._active.values()}
+
+    async def _run(self, job: Job):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        async with self._semaphore:
+            job.set_status("running")
+            try:
+                await self.runner(job)
+                status, error = "done", None
+            except Exception as e:
+                status, error = "failed", str(e)
+
+            with self._lock:
+                self._active.pop(job.article_id, None)
+            job.set_status(status, error)
+
+    # 끝난 작업은 오래된 것부터 max_history개만 남김
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self._jobs[job_id]
+
+
+# endregion
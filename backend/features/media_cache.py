@@ -0,0 +1,133 @@
+import glob
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+from contextlib import contextmanager
+from uuid import uuid4
+
+import numpy as np
+
+
+# region 미디어 캐시
+# 유튜브 영상 id + 다운로드 포맷 기준으로 MP4 / WAV / 정렬용 모노 신호를 보관
+# - 파일 이름: <영상 id>-<포맷 해시>.<종류>.<확장자>
+# - 쓰기는 임시 파일에 기록 후 os.replace로 교체 (동시에 같은 항목을 써도 읽는 쪽은 완성된 파일만 봄)
+# - 조회할 때마다 수정 시각을 갱신하고 전체 크기가 max_bytes를 넘으면 오래된 항목부터 삭제 (LRU)
+class MediaCache:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def key(video_id: str, fmt: str) -> str:
+        return f"{video_id}-{hashlib.sha1(fmt.encode()).hexdigest()[:10]}"
+
+    def _pattern(self, key: str, kind: str) -> str:
+        return os.path.join(self.root, f"{glob.escape(key)}.{kind}.*")
+
+    # 캐시된 파일 경로 (없으면 None)
+    def get(self, key: str, kind: str):
+        for path in glob.glob(self._pattern(key, kind)):
+            if path.endswith(".tmp"):
+                continue
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                # 조회 중 다른 작업이 삭제한 경우
+                continue
+            return path
+        return None
+
+    # 캐시에 쓸 임시 경로를 제공하고, 블록이 정상 종료되면 최종 경로로 교체
+    @contextmanager
+    def writer(self, key: str, kind: str, ext: str):
+        final_path = os.path.join(self.root, f"{key}.{kind}.{ext}")
+        temp_path = f"{final_path}.{uuid4().hex}.tmp"
+        try:
+            yield temp_path
+            os.replace(temp_path, final_path)
+            os.utime(final_path)  # 하드 링크는 원본 파일의 수정 시각을 그대로 가지므로 갱신
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self.evict()
+
+    # 파일을 캐시에 저장 (같은 파일 시스템이면 하드 링크, 아니면 복사) -> 캐시 경로
+    def put(self, key: str, kind: str, src_path: str) -> str:
+        ext = os.path.splitext(src_path)[1].lstrip(".") or "bin"
+        with self.writer(key, kind, ext) as temp_path:
+            link_or_copy(src_path, temp_path)
+        return os.path.join(self.root, f"{key}.{kind}.{ext}")
+
+    def put_array(self, key: str, kind: str, array) -> str:
+        with self.writer(key, kind, "npy") as temp_path:
+            with open(temp_path, "wb") as f:
+                np.save(f, np.asarray(array, dtype=np.float32))
+        return os.path.join(self.root, f"{key}.{kind}.npy")
+
+    # 메모리 맵으로 읽기 (없으면 None)
+    def get_array(self, key: str, kind: str):
+        path = self.get(key, kind)
+        if path is None:
+            return None
+        return np.load(path, mmap_mode="r")
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.root):
+                if not entry.is_file() or entry.name.endswith(".tmp"):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    # 사용 중인 파일도 이미 열린 핸들은 유지됨 (POSIX)
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+            # 중단된 작업이 남긴 오래된 임시 파일 정리
+            for path in glob.glob(os.path.join(self.root, "*.tmp")):
+                try:
+                    if time.time() - os.path.getmtime(path) > 24 * 3600:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+# 하드 링크를 시도하고 실패하면 복사 (기존 파일은 덮어씀)
+def link_or_copy(src_path: str, dst_path: str):
+    if os.path.exists(dst_path):
+        os.remove(dst_path)
+    try:
+        os.link(src_path, dst_path)
+    except OSError:
+        shutil.copyfile(src_path, dst_path)
+
+
+_media_cache = None
+
+
+# 프로세스 전체에서 공유하는 캐시 (MEDIA_CACHE_DIR, MEDIA_CACHE_MAX_GB 환경 변수로 설정)
+def get_media_cache() -> MediaCache:
+    global _media_cache
+    if _media_cache is None:
+        _media_cache = MediaCache(
+            os.getenv("MEDIA_CACHE_DIR", "./cache/media"),
+            int(float(os.getenv("MEDIA_CACHE_MAX_GB", "20")) * 2 ** 30),
+        )
+    return _media_cache
+
+
+# endregion
@@ -0,0 +1,72 @@
+import asyncio
+
+
+# region 단계별 파이프라인
+# 항목마다 단계를 순서대로 거치되, 앞 단계가 끝난 항목은 바로 다음 단계로 넘어감 (단계 사이는 큐로 연결)
+# stages: [(단계 이름, 코루틴 함수, 동시 실행 수), ...]
+#   - 함수가 False를 반환하면 그 항목은 다음 단계로 넘기지 않음
+#   - 예외가 발생하면 그 항목만 중단하고 errors에 기록
+# on_progress: 항목 하나가 단계를 마칠 때마다 (단계 이름, 완료 수, 전체 항목 수)를 받는 함수
+#   (중간에 빠지는 항목이 있으면 뒤 단계는 전체 항목 수에 못 미친 채로 끝남)
+class Pipeline:
+    def __init__(self, stages: list, on_progress=None):
+        self.stages = stages
+        self.on_progress = on_progress
+        self.errors = {}  # 항목 -> (단계 이름, 예외)
+        self.completed = []  # 모든 단계를 마친 항목 (완료 순서)
+
+    async def run(self, items: list):
+        queues = [asyncio.Queue() for _ in self.stages]
+        done = [0] * len(self.stages)
+
+        async def worker(i):
+            name, func, _ = self.stages[i]
+            while True:
+                item = await queues[i].get()
+                try:
+                    forward = await func(item) is not False
+                except Exception as e:
+                    self.errors[item] = (name, e)
+                    forward = False
+
+                done[i] += 1
+                if forward:
+                    if i + 1 < len(self.stages):
+                        queues[i + 1].put_nowait(item)
+                    else:
+                        self.completed.append(item)
+                if self.on_progress is not None:
+                    self.on_progress(name, done[i], len(items))
+                queues[i].task_done()
+
+        workers = [
+            asyncio.create_task(worker(i))
+            for i, (_, _, concurrency) in enumerate(self.stages)
+            for _ in range(max(1, concurrency))
+        ]
+
+        for item in items:
+            queues[0].put_nowait(item)
+
+        try:
+            # 앞 단계가 모두 끝나야 다음 단계에 더 들어올 항목이 없으므로 순서대로 대기
+            for queue in queues:
+                await queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        return self.completed
+
+
+# "download=4,align=1" 형식의 단계별 동시 실행 수
+def parse_concurrency(value: str) -> dict:
+    result = {}
+    for item in filter(None, (v.strip() for v in value.split(","))):
+        name, count = item.split("=")
+        result[name.strip()] = int(count)
+    return result
+
+
+# endregion
@@ -0,0 +1,105 @@
+# region Imports
+import resource
+import time
+import tracemalloc
+
+from contextlib import contextmanager, nullcontext
+
+# endregion
+
+
+# region 단계별 프로파일러
+
+# 처리 단계별 실행 시간 / CPU 시간 / 최대 할당 바이트 기록
+# callback: 단계가 끝날 때마다 (단계 이름, 이번 측정값 dict)를 받는 함수 (웹 진행 상황 전달용)
+class StageProfiler:
+    def __init__(self, callback=None, trace_memory=True):
+        self.callback = callback
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.info = {}
+        self._started_tracing = False
+        self._start_wall = None
+
+    # 첫 단계에서 자동으로 호출됨 (stop 이후 다시 사용하면 메모리 추적만 재개)
+    def start(self):
+        if self._start_wall is None:
+            self._start_wall = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    # 자식 프로세스 CPU 시간 포함 (프로세스 풀 작업은 풀이 종료되어야 합산됨)
+    @staticmethod
+    def _cpu_time():
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return time.process_time() + children.ru_utime + children.ru_stime
+
+    @contextmanager
+    def stage(self, name):
+        self.start()
+
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+        start_wall = time.perf_counter()
+        start_cpu = self._cpu_time()
+        try:
+            yield
+        finally:
+            record = {
+                "wall_s": time.perf_counter() - start_wall,
+                "cpu_s": self._cpu_time() - start_cpu,
+                "peak_bytes": tracemalloc.get_traced_memory()[1] - base if tracing else None,
+            }
+            self._accumulate(name, record)
+            if self.callback is not None:
+                self.callback(name, record)
+
+    # 블록 단위 처리처럼 같은 단계가 여러 번 호출되면 시간은 합산, 메모리는 최대값
+    def _accumulate(self, name, record):
+        total = self.stages.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "peak_bytes": None, "calls": 0})
+        total["wall_s"] += record["wall_s"]
+        total["cpu_s"] += record["cpu_s"]
+        total["calls"] += 1
+        if record["peak_bytes"] is not None:
+            total["peak_bytes"] = max(total["peak_bytes"] or 0, record["peak_bytes"])
+
+    def report(self):
+        return {
+            "total_wall_s": None if self._start_wall is None else time.perf_counter() - self._start_wall,
+            "stages": self.stages,
+            **self.info,
+        }
+
+
+# 프로파일링이 꺼져 있을 때 사용하는 빈 프로파일러 (단계마다 같은 nullcontext를 반환)
+class NullProfiler:
+    _context = nullcontext()
+
+    # 측정하지 않을 때는 기록할 필요가 없으므로 매번 새 dict를 돌려주고 버림
+    # (NULL_PROFILER는 모든 작업이 함께 쓰므로 dict를 보관하면 작업끼리 섞이고 계속 남음)
+    @property
+    def info(self):
+        return {}
+
+    def stage(self, name):
+        return self._context
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+# endregion
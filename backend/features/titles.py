@@ -0,0 +1,47 @@
+import re
+
+# 제목 해석 방식 (process_title, is_listed, emoji_keys)을 바꾸면 올려서 DB에 저장된 해석 결과를 다시 계산
+TITLE_PARSER_VERSION = 2
+
+# 이모지 검색 토큰에서 제외할 문자 (변형 선택자, ZWJ)
+EMOJI_JOINERS = {0xFE0E, 0xFE0F, 0x200D}
+
+
+# region 제목 처리
+def process_title(title: str) -> list:
+    if "했어요]" in title:
+        splited_title = title.split("했어요]")[1].replace(" 반응정리", "").split("/")
+    else:
+        splited_title = title.replace(" 반응정리", "").split("/")
+
+    final_title = "".join(splited_title[:-1])
+    viewer = splited_title[-1]
+
+    return [final_title, normalize_viewer(viewer)]
+
+
+# 시청자 이모지 처리 (게시물 제목과 검색어에 같은 변환 적용)
+def normalize_viewer(viewer: str) -> str:
+    viewer = viewer.replace("💙", "🩵")
+    viewer = viewer.replace("🖤", "💙")
+    return viewer
+
+
+# 목록에 표시할 게시물인지 (시청자 부분에 한글 / 영문이 없는 경우만 표시)
+def is_listed(viewer: str) -> bool:
+    return not bool(re.search(r"[가-힣A-Za-z]", viewer))
+
+
+# 시청자 이모지 -> 검색 토큰 ("u1f499 u1fa75", 코드 포인트별 영숫자 토큰이므로 FTS에서 정확히 일치)
+def emoji_keys(viewer: str) -> str:
+    keys = (f"u{ord(c):x}" for c in viewer if ord(c) not in EMOJI_JOINERS and not c.isspace())
+    return " ".join(dict.fromkeys(keys))
+
+
+# 게시물 제목 -> (제목, 시청자, 목록 표시 여부, 시청자 검색 토큰)
+def parse_title(title: str) -> tuple:
+    final_title, viewer = process_title(title)
+    return final_title, viewer, is_listed(viewer), emoji_keys(viewer)
+
+
+# endregion
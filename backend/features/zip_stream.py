@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import shutil
+import struct
+import time
+import zlib
+
+# region 무압축 ZIP 스트리밍
+# 이미 압축된 영상 파일을 저장(stored) 방식으로 묶은 ZIP을 디스크에 만들지 않고 바로 전송
+# 파일 크기와 CRC를 미리 알고 있으므로 전체 바이트 배치가 고정되어 임의 구간(Range) 요청에 응답 가능
+
+ZIP64_LIMIT = 0xFFFFFFFF
+UTF8_FLAG = 0x0800  # 한글 파일 이름
+
+
+def _dos_time(mtime: float):
+    t = time.localtime(max(mtime, 315532800))  # 1980-01-01 이전은 표현 불가
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def file_crc32(path: str, chunk_size: int = 1 << 22) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+class StoredZip:
+    # entries: [{"name": 압축 파일 안 이름, "path": 파일 경로, "size": 크기, "crc": CRC32, "mtime": 수정 시각}, ...]
+    def __init__(self, entries: list, force_zip64: bool = False):
+        self.entries = entries
+        self.segments = []  # (시작 위치, bytes 또는 (파일 경로, 크기))
+        self.size = 0
+
+        # 내용이 같으면 같은 값 (이어받기 요청의 If-Range 비교용)
+        identity = json.dumps([[e["name"], e["size"], e["crc"], e["mtime"]] for e in entries], ensure_ascii=False)
+        self.etag = hashlib.sha1(identity.encode()).hexdigest()[:20]
+
+        central = []
+        for entry in entries:
+            name = entry["name"].encode("utf-8")
+            size = entry["size"]
+            offset = self.size
+            dos_time, dos_date = _dos_time(entry["mtime"])
+            zip64 = force_zip64 or size >= ZIP64_LIMIT or offset >= ZIP64_LIMIT
+
+            # 로컬 헤더 + 파일 내용
+            if zip64:
+                extra = struct.pack("<HHQQ", 0x0001, 16, size, size)
+                local_size = ZIP64_LIMIT
+            else:
+                extra = b""
+                local_size = size
+            version = 45 if zip64 else 20
+            header = struct.pack("<IHHHHHIIIHH", 0x04034b50, version, UTF8_FLAG, 0, dos_time, dos_date,
+                                 entry["crc"], local_size, local_size, len(name), len(extra)) + name + extra
+            self._add(header)
+            self._add((entry["path"], size))
+
+            # 중앙 디렉터리 (0xFFFFFFFF로 표시한 값만 zip64 확장 필드에 순서대로 기록)
+            fields = []
+            cd_size = size
+            cd_offset = offset
+            if zip64 or size >= ZIP64_LIMIT:
+                fields += [size, size]
+                cd_size = ZIP64_LIMIT
+            if zip64 or offset >= ZIP64_LIMIT:
+                fields.append(offset)
+                cd_offset = ZIP64_LIMIT
+            cd_extra = struct.pack(f"<HH{len(fields)}Q", 0x0001, 8 * len(fields), *fields) if fields else b""
+            central.append(struct.pack("<IHHHHHHIIIHHHHHII", 0x02014b50, version, version, UTF8_FLAG, 0,
+                                       dos_time, dos_date, entry["crc"], cd_size, cd_size, len(name),
+                                       len(cd_extra), 0, 0, 0, 0o100644 << 16, cd_offset) + name + cd_extra)
+
+        cd_offset = self.size
+        cd_bytes = b"".join(central)
+        self._add(cd_bytes)
+
+        # 끝 레코드 (필요하면 zip64 끝 레코드와 위치 정보 추가)
+        n = len(entries)
+        if force_zip64 or n >= 0xFFFF or cd_offset >= ZIP64_LIMIT or len(cd_bytes) >= ZIP64_LIMIT:
+            zip64_eocd_offset = self.size
+            self._add(struct.pack("<IQHHIIQQQQ", 0x06064b50, 44, 45, 45, 0, 0, n, n, len(cd_bytes), cd_offset))
+            self._add(struct.pack("<IIQI", 0x07064b50, 0, zip64_eocd_offset, 1))
+        self._add(struct.pack("<IHHHHIIH", 0x06054b50, 0, 0, min(n, 0xFFFF), min(n, 0xFFFF),
+                              min(len(cd_bytes), ZIP64_LIMIT), min(cd_offset, ZIP64_LIMIT), 0))
+
+    def _add(self, part):
+        self.segments.append((self.size, part))
+        self.size += len(part) if isinstance(part, bytes) else part[1]
+
+    # [start, stop) 구간의 바이트를 순서대로 생성
+    def iter_range(self, start: int = 0, stop: int = None, chunk_size: int = 1 << 20):
+        stop = self.size if stop is None else min(stop, self.size)
+        for seg_start, part in self.segments:
+            seg_len = len(part) if isinstance(part, bytes) else part[1]
+            s = max(start, seg_start)
+            e = min(stop, seg_start + seg_len)
+            if e <= s:
+                continue
+
+            if isinstance(part, bytes):
+                yield part[s - seg_start:e - seg_start]
+                continue
+
+            with open(part[0], "rb") as f:
+                f.seek(s - seg_start)
+                remaining = e - s
+                while remaining > 0:
+                    chunk = f.read(min(chunk_size, remaining))
+                    if not chunk:
+                        raise IOError(f"파일이 예상보다 짧습니다: {part[0]}")
+                    remaining -= len(chunk)
+                    yield chunk
+
+
+# endregion
+
+
+# region 묶음 (bundle) 관리
+# 게시글 작업 폴더 안 bundle/ 폴더의 완성 파일과 manifest.json (파일별 크기, CRC, 수정 시각)
+
+MANIFEST_NAME = "manifest.json"
+
+
+def manifest_entry(path: str) -> dict:
+    stat = os.stat(path)
+    return {"name": os.path.basename(path), "size": stat.st_size, "crc": file_crc32(path), "mtime": stat.st_mtime}
+
+
+# entries: 미리 계산한 항목 (주지 않으면 폴더의 파일을 모두 읽어 계산)
+def write_manifest(bundle_dir: str, entries: list = None) -> dict:
+    if entries is None:
+        entries = []
+        for name in os.listdir(bundle_dir):
+            path = os.path.join(bundle_dir, name)
+            if name == MANIFEST_NAME or not os.path.isfile(path):
+                continue
+            entries.append(manifest_entry(path))
+
+    entries = sorted(entries, key=lambda e: e["name"])
+    manifest = {"entries": entries, "created_at": time.time()}
+    temp_path = os.path.join(bundle_dir, MANIFEST_NAME + ".tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(temp_path, os.path.join(bundle_dir, MANIFEST_NAME))
+    return manifest
+
+
+# 완성된 묶음을 ZIP으로 열기 (manifest가 없거나 파일이 바뀌었으면 None)
+def open_bundle(bundle_dir: str):
+    try:
+        with open(os.path.join(bundle_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    entries = []
+    for entry in manifest["entries"]:
+        path = os.path.join(bundle_dir, entry["name"])
+        if not os.path.isfile(path) or os.path.getsize(path) != entry["size"]:
+            return None
+        entries.append({**entry, "path": path})
+    return StoredZip(entries)
+
+
+# 작업 폴더의 마지막 작업 시각 (묶음이 완성됐으면 manifest 생성 시각, 아니면 가장 최근에 바뀐 파일의 시각)
+# 폴더 자체의 수정 시각은 안쪽 파일을 다시 써도 바뀌지 않으므로 사용하지 않음
+def last_activity(work_dir: str) -> float:
+    try:
+        with open(os.path.join(work_dir, "bundle", MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)["created_at"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+
+    latest = os.stat(work_dir).st_mtime
+    for dir_path, _, file_names in os.walk(work_dir):
+        for name in file_names:
+            try:
+                latest = max(latest, os.stat(os.path.join(dir_path, name)).st_mtime)
+            except FileNotFoundError:
+                continue
+    return latest
+
+
+# 오래된 작업 폴더 정리 (root/<게시글 id>/<작업 id>, 전송이 끝나지 않고 남은 묶음 등)
+# active: 대기 중이거나 실행 중인 작업 id (마지막 작업 시각과 관계없이 남김)
+# streaming: 전송 중인 작업 폴더의 절대 경로 (보관 시간이 지났어도 전송이 끝날 때까지 남김)
+def cleanup_stale_dirs(root: str, max_age_seconds: float, active=(), streaming=()):
+    if not os.path.isdir(root):
+        return
+    now = time.time()
+    for article in os.scandir(root):
+        if not article.is_dir() or os.path.abspath(article.path) in streaming:
+            continue
+        for entry in os.scandir(article.path):
+            if not entry.is_dir() or entry.name in active or os.path.abspath(entry.path) in streaming:
+                continue
+            try:
+                stale = now - last_activity(entry.path) > max_age_seconds
+            except FileNotFoundError:
+                continue
+            if stale:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+        # 비어 있는 게시글 폴더 삭제
+        try:
+            os.rmdir(article.path)
+        except OSError:
+            pass
+
+
+# endregion
@@ -1,21 +1,37 @@
-import React, { useEffect, useState, useCallback } from 'react';
+import React, { useEffect, useState, useCallback, useRef } from 'react';
 import Menu from './Menu.jsx';
 import { useNavigate } from "react-router-dom";
 import Twemoji from 'react-twemoji';
 import "./ListPage.css";
 
+// 한 번에 불러올 게시물 수
+const PAGE_SIZE = 50;
+
 
 const ListPage = () => {
-    const [items, setItems] = useState({});
+    const [items, setItems] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [query, setQuery] = useState("");
+    const [viewer, setViewer] = useState("");
+    const requestId = useRef(0);
     const navigate = useNavigate();
 
-    // 데이터 가져오는 함수
-    const fetchData = useCallback(() => {
-        fetch("/api/data")
+    // 데이터 가져오는 함수 (before가 없으면 첫 페이지부터 다시, 있으면 이어서 추가)
+    const fetchData = useCallback((before = null) => {
+        const params = new URLSearchParams({ limit: PAGE_SIZE, q: query, viewer: viewer });
+        if (before !== null) params.set("before", before);
+
+        // 검색어가 바뀐 뒤 늦게 도착한 이전 응답은 무시
+        const id = ++requestId.current;
+        fetch("/api/data?" + params.toString())
             .then(response => response.json())
-            .then(data => setItems(data))
+            .then(data => {
+                if (id !== requestId.current) return;
+                setItems(prev => before === null ? data.items : [...prev, ...data.items]);
+                setNextCursor(data.next_cursor);
+            })
             .catch(error => console.error("Error fetching data:", error));
-    }, []);
+    }, [query, viewer]);
 
     // 데이터 새로고침 함수
     const refreshData = useCallback(() => {
@@ -25,8 +41,10 @@ const ListPage = () => {
     }, []);
 
 
+    // 검색어 입력이 멈추면 첫 페이지부터 다시 불러옴
     useEffect(() => {
-        fetchData();
+        const timer = setTimeout(() => fetchData(), 250);
+        return () => clearTimeout(timer);
     }, [fetchData]);
 
     return (
@@ -39,22 +57,33 @@ const ListPage = () => {
                     크롤링하기
                 </button>
             </div>
-            {Object.entries(items)
-                .reverse()
-                .map(([key, value]) => (
-                    <div className="container" key={key}>
-                        <button className="action-button" onClick={() => navigate("/loading/" + key)}>
-                            {value[0]}
-                        </button>
-                        <div className="emoji-box">
-                            <Twemoji options={{className: 'custom-twemoji'}}>
-                                {value[1]}
-                            </Twemoji>
-                        </div>
+            <div className="container">
+                <input className="search-input" placeholder="노래 제목 검색" value={query}
+                       onChange={event => setQuery(event.target.value)}/>
+                <input className="search-input" placeholder="시청자 이모지" value={viewer}
+                       onChange={event => setViewer(event.target.value)}/>
+            </div>
+            {items.map(item => (
+                <div className="container" key={item.id}>
+                    <button className="action-button" onClick={() => navigate("/loading/" + item.id)}>
+                        {item.title}
+                    </button>
+                    <div className="emoji-box">
+                        <Twemoji options={{className: 'custom-twemoji'}}>
+                            {item.viewer}
+                        </Twemoji>
                     </div>
-                ))}
+                </div>
+            ))}
+            {nextCursor !== null && (
+                <div className="container">
+                    <button className="more-button" onClick={() => fetchData(nextCursor)}>
+                        더 보기
+                    </button>
+                </div>
+            )}
         </div>
     );
 };
 
-export default ListPage;
\ No newline at end of file
+export default ListPage;
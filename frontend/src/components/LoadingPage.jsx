@@ -8,81 +8,66 @@ const LoadingPage = () => {
     const params = useParams();
     const [loadingText, setLoadingText] = useState("다운로드중");
     const [messages, setMessages] = useState([]);
-    const [isPolling, setIsPolling] = useState(true);
+    const [percent, setPercent] = useState(0);
+    const [jobId, setJobId] = useState(null);
 
-    const downloadData = async () => {
+    const downloadData = async (job) => {
         setLoadingText("다운로드 완료");
-        setIsPolling(false);
 
+        // 브라우저가 직접 받도록 링크로 다운로드 (서버가 ZIP을 바로 생성하여 전송, 끊기면 이어받기 가능)
+        // 묶음은 작업별 폴더에 있으므로 작업 id를 함께 보냄, 전송이 끝나면 서버에서 파일을 정리하므로 삭제 요청은 보내지 않음
         const filename = `${params.id}.zip`;
-        try {
-            // 파일 다운로드 (GET 요청)
-            const response = await fetch('/api/download/' + filename, {
-                method: "GET"
-            });
-
-            if (!response.ok) {
-                alert("파일 다운로드 실패");
-                return;
-            }
-
-            const blob = await response.blob();
-
-            // Blob URL 생성 및 임시 a 태그로 다운로드 트리거
-            const url = window.URL.createObjectURL(blob);
-            const link = document.createElement("a");
-            link.href = url;
-            link.setAttribute("download", filename);
-            document.body.appendChild(link);
-            link.click();
-            window.URL.revokeObjectURL(url);
-            link.remove();
-
-            // 다운로드 후 파일 삭제 (DELETE 요청)
-            const deleteResponse = await fetch('/api/delete/' + filename, {
-                method: "DELETE"
-            });
-            if (!deleteResponse.ok) {
-                alert("파일 삭제 요청 실패");
-            }
-        } catch (error) {
-            console.error("Error downloading the file:", error);
-            alert("파일 다운로드 실패");
-
-        }
+        const link = document.createElement("a");
+        link.href = '/api/download/' + encodeURIComponent(job) + '/' + encodeURIComponent(filename);
+        link.setAttribute("download", filename);
+        document.body.appendChild(link);
+        link.click();
+        link.remove();
 
         navigate("/list");
 
 
     };
 
-    // 일정 간격마다 진행 상황을 요청하는 함수
-    function pollProgress() {
-        fetch('/api/progress')
-            .then(response => response.text()) // Get the response as text
-            .then(text => {
-                const data = JSON.parse(text); // Parse the text as JSON
-                setMessages(data);
-            })
-            .catch(error => console.error('Error fetching progress:', error));
-    }
-
+    // 다운로드 작업 등록 (같은 게시글 작업이 진행 중이면 그 작업 id를 받음)
     useEffect(() => {
         fetch("/api/download_signal/" + params.id)
             .then(response => response.json())
-            .then(() => {
-                downloadData();
+            .then(data => {
+                setMessages([]);
+                setJobId(data.job_id);
             })
             .catch(error => console.error("Error fetching data:", error));
     }, [params.id]);
 
-    // 컴포넌트가 마운트될 때 폴링 시작
+    // 작업 진행 이벤트 구독 (서버가 새 이벤트만 전송, 끊기면 브라우저가 마지막 id부터 자동 재연결)
     useEffect(() => {
-        if (isPolling) {
-            const interval = setInterval(pollProgress, 1000); // Call pollProgress every 5 seconds
-            return () => clearInterval(interval); // Cleanup interval on component unmount
-        }
-    }, [isPolling]);
+        if (!jobId) return;
+
+        const source = new EventSource(`/api/jobs/${jobId}/events`);
+
+        source.addEventListener("progress", event => {
+            const data = JSON.parse(event.data);
+            setMessages(prev => prev.concat(data.message));
+            if (data.percent !== null) {
+                setPercent(data.percent);
+            }
+        });
+
+        source.addEventListener("status", event => {
+            const data = JSON.parse(event.data);
+            if (data.status === "done") {
+                source.close();
+                downloadData(jobId);
+            } else if (data.status === "failed") {
+                source.close();
+                alert("다운로드 실패: " + data.error);
+                navigate("/list");
+            }
+        });
+
+        return () => source.close();
+    }, [jobId]);
 
     useEffect(() => {
         // 로딩 텍스트 애니메이션 (500ms마다 점 추가)
@@ -111,6 +96,7 @@ const LoadingPage = () => {
                     <tr><td height="10"></td></tr>
                     <tr><td className="title">{loadingText}</td></tr>
                     <tr><td height="10"></td></tr>
+                    <tr><td align="center">{percent}%</td></tr>
                     <tr><td height="50"></td></tr>
                 </tbody>
             </table>